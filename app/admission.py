@@ -0,0 +1,210 @@
+import asyncio
+import bisect
+import itertools
+import math
+import time
+from collections.abc import Callable
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+
+from fastapi import Request
+
+from .env import (
+    ADMISSION_BULK_LIMIT,
+    ADMISSION_BULK_QUEUE,
+    ADMISSION_INTERACTIVE_LIMIT,
+    ADMISSION_INTERACTIVE_QUEUE,
+    ADMISSION_LISTING_LIMIT,
+    ADMISSION_LISTING_QUEUE,
+    ADMISSION_MAX_CONCURRENCY,
+    ADMISSION_QUEUE_TIMEOUT,
+)
+from .exception import CustomError
+
+
+@dataclass
+class OperationClass:
+    priority: int
+    limit: int
+    max_queue: int
+    active: int = 0
+    queued: int = 0
+    admitted: int = 0
+    rejected: int = 0
+    timed_out: int = 0
+    total_wait: float = 0.0
+    max_wait: float = 0.0
+
+    def stats(self) -> dict:
+        return {
+            "priority": self.priority,
+            "limit": self.limit,
+            "max_queue": self.max_queue,
+            "active": self.active,
+            "queued": self.queued,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "timed_out": self.timed_out,
+            "avg_wait_ms": (
+                round(self.total_wait / self.admitted * 1000, 3)
+                if self.admitted
+                else 0.0
+            ),
+            "max_wait_ms": round(self.max_wait * 1000, 3),
+        }
+
+
+class AdmissionController:
+    """
+    Shares a fixed number of slots between operation classes.
+    - Each class has its own concurrency limit and a bounded queue.
+    - Freed slots go to the waiting request with the lowest priority value, so
+      interactive reads overtake queued listings and bulk work.
+    - A full queue is rejected immediately with 429, a request that waits longer than
+      `queue_timeout` gets 503. Both carry a `Retry-After` header.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int,
+        queue_timeout: float,
+        classes: dict[str, OperationClass],
+    ):
+        self.max_concurrency = max_concurrency
+        self.queue_timeout = queue_timeout
+        self.classes = classes
+        self.active = 0
+        self._waiters: list[tuple[int, int, str, asyncio.Future]] = []
+        self._sequence = itertools.count()
+
+    def __retry_after(self, operation: OperationClass) -> str:
+        avg_wait = (
+            operation.total_wait / operation.admitted if operation.admitted else 0
+        )
+        return str(max(1, math.ceil(avg_wait * (operation.queued + 1))))
+
+    def __can_run(self, operation: OperationClass) -> bool:
+        return self.active < self.max_concurrency and operation.active < operation.limit
+
+    def __start(self, operation: OperationClass) -> None:
+        self.active += 1
+        operation.active += 1
+        operation.admitted += 1
+
+    def __dispatch(self) -> None:
+        index = 0
+        while index < len(self._waiters) and self.active < self.max_concurrency:
+            _, _, name, future = self._waiters[index]
+            operation = self.classes[name]
+            if future.done() or not self.__can_run(operation):
+                index += 1
+                continue
+            del self._waiters[index]
+            operation.queued -= 1
+            future.set_result(None)
+            self.__start(operation)
+
+    async def acquire(self, name: str) -> None:
+        operation = self.classes[name]
+
+        future = asyncio.get_running_loop().create_future()
+        waiter = (operation.priority, next(self._sequence), name, future)
+        bisect.insort(self._waiters, waiter)
+        operation.queued += 1
+        self.__dispatch()
+
+        if future.done():
+            return
+
+        if operation.queued > operation.max_queue:
+            self._waiters.remove(waiter)
+            operation.queued -= 1
+            operation.rejected += 1
+            raise CustomError(
+                status_code=429,
+                message=f"Too many queued '{name}' requests.",
+                headers={"Retry-After": self.__retry_after(operation)},
+            )
+
+        started = time.perf_counter()
+        try:
+            await asyncio.wait_for(asyncio.shield(future), self.queue_timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if future.done():
+                # The slot was granted while timing out, hand it back.
+                self.release(name)
+            else:
+                future.cancel()
+                self._waiters.remove(waiter)
+                operation.queued -= 1
+            if isinstance(e, asyncio.CancelledError):
+                raise
+            operation.timed_out += 1
+            raise CustomError(
+                status_code=503,
+                message=f"Timed out waiting for a '{name}' slot.",
+                headers={"Retry-After": str(math.ceil(self.queue_timeout))},
+            ) from e
+
+        wait = time.perf_counter() - started
+        operation.total_wait += wait
+        operation.max_wait = max(operation.max_wait, wait)
+
+    def release(self, name: str) -> None:
+        self.active -= 1
+        self.classes[name].active -= 1
+        self.__dispatch()
+
+    @asynccontextmanager
+    async def slot(self, name: str):
+        await self.acquire(name)
+        try:
+            yield
+        finally:
+            self.release(name)
+
+    def stats(self) -> dict:
+        return {
+            "max_concurrency": self.max_concurrency,
+            "active": self.active,
+            "queued": len(self._waiters),
+            "classes": {name: op.stats() for name, op in self.classes.items()},
+        }
+
+
+admission = AdmissionController(
+    max_concurrency=ADMISSION_MAX_CONCURRENCY,
+    queue_timeout=ADMISSION_QUEUE_TIMEOUT,
+    classes={
+        "interactive": OperationClass(
+            priority=0,
+            limit=ADMISSION_INTERACTIVE_LIMIT,
+            max_queue=ADMISSION_INTERACTIVE_QUEUE,
+        ),
+        "listing": OperationClass(
+            priority=1,
+            limit=ADMISSION_LISTING_LIMIT,
+            max_queue=ADMISSION_LISTING_QUEUE,
+        ),
+        "bulk": OperationClass(
+            priority=2,
+            limit=ADMISSION_BULK_LIMIT,
+            max_queue=ADMISSION_BULK_QUEUE,
+        ),
+    },
+)
+
+
+def admit(operation: str | Callable[[Request], str]):
+    """
+    Returns a dependency that holds an admission slot of the given operation class
+    for the duration of the request. `operation` may be a callable that picks the
+    class from the request.
+    """
+
+    async def dependency(request: Request):
+        name = operation(request) if callable(operation) else operation
+        async with admission.slot(name):
+            yield
+
+    return dependency
@@ -0,0 +1,155 @@
+import io
+import os
+import tarfile
+import time
+import zipfile
+from collections.abc import Iterable, Iterator
+from pathlib import Path
+
+import anyio.from_thread
+
+CHUNK_SIZE = 1024 * 1024
+TAR_BLOCK_SIZE = tarfile.BLOCKSIZE
+
+ExportEntry = tuple[Path, str, os.stat_result]
+
+MEDIA_TYPES = {
+    "tar": "application/x-tar",
+    "zip": "application/zip",
+}
+
+
+class ChunkBuffer(io.RawIOBase):
+    """
+    Write-only, non-seekable file object that collects what zipfile writes until
+    the streaming response drains it.
+    """
+
+    def __init__(self):
+        self.chunks: list[bytes] = []
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self) -> bytes:
+        data = b"".join(self.chunks)
+        self.chunks.clear()
+        return data
+
+
+class RequestReader(io.RawIOBase):
+    """
+    Blocking, read-only view of an async request body stream, for use from a
+    worker thread started by anyio (e.g. `run_in_threadpool`).
+    """
+
+    def __init__(self, stream):
+        self._stream = stream.__aiter__()
+        self._buffer = b""
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        while not self._buffer:
+            try:
+                self._buffer = anyio.from_thread.run(self._stream.__anext__)
+            except StopAsyncIteration:
+                return 0
+        size = min(len(buffer), len(self._buffer))
+        buffer[:size] = self._buffer[:size]
+        self._buffer = self._buffer[size:]
+        return size
+
+
+def _read_exactly(full_path: Path, size: int) -> Iterator[bytes]:
+    """
+    Yields exactly `size` bytes of the file in large sequential chunks, padding
+    with zeros if it shrank since it was stat'ed, so the archive stays valid.
+    """
+    remaining = size
+    with open(full_path, "rb") as f:
+        while remaining:
+            chunk = f.read(min(CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+    while remaining:
+        padding = min(CHUNK_SIZE, remaining)
+        remaining -= padding
+        yield b"\0" * padding
+
+
+def tar_stream(entries: Iterable[ExportEntry]) -> Iterator[bytes]:
+    for full_path, arcname, stat in entries:
+        info = tarfile.TarInfo(arcname)
+        info.size = stat.st_size
+        info.mtime = stat.st_mtime
+        info.mode = 0o644
+        yield info.tobuf(format=tarfile.PAX_FORMAT)
+        yield from _read_exactly(full_path, stat.st_size)
+        if stat.st_size % TAR_BLOCK_SIZE:
+            yield b"\0" * (TAR_BLOCK_SIZE - stat.st_size % TAR_BLOCK_SIZE)
+    yield b"\0" * (TAR_BLOCK_SIZE * 2)
+
+
+def zip_stream(entries: Iterable[ExportEntry]) -> Iterator[bytes]:
+    buffer = ChunkBuffer()
+    with zipfile.ZipFile(buffer, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        for full_path, arcname, stat in entries:
+            info = zipfile.ZipInfo(
+                arcname, date_time=time.localtime(max(stat.st_mtime, 315619200))[:6]
+            )
+            info.compress_type = zipfile.ZIP_DEFLATED
+            with archive.open(info, "w", force_zip64=True) as dst:
+                for chunk in _read_exactly(full_path, stat.st_size):
+                    dst.write(chunk)
+                    yield buffer.drain()
+            yield buffer.drain()
+    yield buffer.drain()
+
+
+def coalesce(chunks: Iterable[bytes], size: int = CHUNK_SIZE) -> Iterator[bytes]:
+    """
+    Merges small chunks (tar headers, padding) into pieces of about `size` bytes,
+    so the response is not sent in tiny writes.
+    """
+    pending: list[bytes] = []
+    pending_size = 0
+    for chunk in chunks:
+        pending.append(chunk)
+        pending_size += len(chunk)
+        if pending_size >= size:
+            yield b"".join(pending)
+            pending.clear()
+            pending_size = 0
+    if pending_size:
+        yield b"".join(pending)
+
+
+def export_stream(entries: Iterable[ExportEntry], format: str) -> Iterator[bytes]:
+    match format:
+        case "tar":
+            return coalesce(tar_stream(entries))
+        case "zip":
+            return coalesce(zip_stream(entries))
+
+
+def iter_tar_members(fileobj: io.BufferedIOBase):
+    with tarfile.open(fileobj=fileobj, mode="r|*") as archive:
+        for member in archive:
+            if member.isfile():
+                yield member.name, archive.extractfile(member)
+
+
+def iter_zip_members(fileobj: io.BufferedIOBase):
+    with zipfile.ZipFile(fileobj) as archive:
+        for info in archive.infolist():
+            if not info.is_dir():
+                with archive.open(info) as src:
+                    yield info.filename, src
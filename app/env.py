@@ -1,3 +1,90 @@
 import os
+import tempfile
 
 BASE_DIR = os.environ.get("BASE_DIR", os.path.dirname(os.path.abspath(__file__)))
+INDEX_REFRESH_INTERVAL = float(os.environ.get("INDEX_REFRESH_INTERVAL", "30"))
+
+# Worker processes, read by uvicorn as well.
+WORKERS = max(1, int(os.environ.get("WEB_CONCURRENCY", "1")))
+
+
+def per_worker(total: int) -> int:
+    """
+    Each worker enforces its own admission and I/O limits, so the configured limits
+    are for the whole host and split evenly between the workers (at least 1 each).
+    """
+    return max(min(total, 1), total // WORKERS)
+
+
+ADMISSION_MAX_CONCURRENCY = per_worker(
+    int(os.environ.get("ADMISSION_MAX_CONCURRENCY", "16"))
+)
+ADMISSION_QUEUE_TIMEOUT = float(os.environ.get("ADMISSION_QUEUE_TIMEOUT", "10"))
+ADMISSION_INTERACTIVE_LIMIT = per_worker(
+    int(os.environ.get("ADMISSION_INTERACTIVE_LIMIT", "16"))
+)
+ADMISSION_INTERACTIVE_QUEUE = per_worker(
+    int(os.environ.get("ADMISSION_INTERACTIVE_QUEUE", "256"))
+)
+ADMISSION_LISTING_LIMIT = per_worker(
+    int(os.environ.get("ADMISSION_LISTING_LIMIT", "2"))
+)
+ADMISSION_LISTING_QUEUE = per_worker(
+    int(os.environ.get("ADMISSION_LISTING_QUEUE", "32"))
+)
+ADMISSION_BULK_LIMIT = per_worker(int(os.environ.get("ADMISSION_BULK_LIMIT", "1")))
+ADMISSION_BULK_QUEUE = per_worker(int(os.environ.get("ADMISSION_BULK_QUEUE", "4")))
+
+PROFILING_TOKEN = os.environ.get("PROFILING_TOKEN", "")
+SLOW_REQUEST_MS = float(os.environ.get("SLOW_REQUEST_MS", "500"))
+
+WARMUP_NOTES = [
+    note.strip()
+    for note in os.environ.get("WARMUP_NOTES", "").split(",")
+    if note.strip()
+]
+HOT_NOTES_FILE = os.environ.get("HOT_NOTES_FILE", "")
+HOT_NOTES_LIMIT = int(os.environ.get("HOT_NOTES_LIMIT", "100"))
+
+LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO")
+ACCESS_LOG = os.environ.get("ACCESS_LOG", "true").lower() in ("1", "true", "yes")
+ACCESS_LOG_SAMPLE_RATE = float(os.environ.get("ACCESS_LOG_SAMPLE_RATE", "1.0"))
+
+VAULT_IDLE_TIMEOUT = float(os.environ.get("VAULT_IDLE_TIMEOUT", "900"))
+VAULT_IO_CONCURRENCY = per_worker(int(os.environ.get("VAULT_IO_CONCURRENCY", "8")))
+VAULT_MAX_NOTES = int(os.environ.get("VAULT_MAX_NOTES", "0"))
+
+
+def parse_vaults(spec: str) -> dict[str, tuple[str, int]]:
+    """
+    Parses "name=/path[:max_notes],..." into {name: (path, max_notes)}. Vaults without
+    their own limit get VAULT_MAX_NOTES. Raises ValueError on a malformed entry, so a
+    typo fails at startup instead of serving the working directory.
+    """
+    vaults = {}
+    for entry in filter(None, (vault.strip() for vault in spec.split(","))):
+        name, _, path = (part.strip() for part in entry.partition("="))
+        head, separator, limit = path.rpartition(":")
+        max_notes = VAULT_MAX_NOTES
+        if separator and limit.isdigit():
+            path, max_notes = head.strip(), int(limit)
+        if not name or not path or "/" in name:
+            raise ValueError(
+                f"Invalid VAULTS entry '{entry}', expected 'name=/path[:max_notes]'."
+            )
+        vaults[name] = (path, max_notes)
+    return vaults
+
+
+# Extra vaults served under /v1/vaults/{vault}/files, e.g. "work=/data/work:20000,home=/data/home".
+# The "default" vault (BASE_DIR) is also served under /v1/files.
+VAULTS = parse_vaults(os.environ.get("VAULTS", ""))
+
+# With more than one worker, vault indexes (and profiling reports) are kept in files
+# under SHARED_INDEX_DIR that all workers share.
+SHARED_INDEX_DIR = os.environ.get("SHARED_INDEX_DIR") or (
+    os.path.join(tempfile.gettempdir(), "file-api-index") if WORKERS > 1 else ""
+)
+SHARED_INDEX_MMAP_SIZE = int(
+    os.environ.get("SHARED_INDEX_MMAP_SIZE", str(256 * 1024 * 1024))
+)
@@ -5,8 +5,14 @@ from typing import Union
 class CustomError(Exception):
     status_code: int
     message: str
+    headers: dict[str, str] | None
 
-    def __init__(self, status_code: int, message: Union[str, dict]):
+    def __init__(
+        self,
+        status_code: int,
+        message: Union[str, dict],
+        headers: dict[str, str] | None = None,
+    ):
         if isinstance(message, dict):
             message = json.dumps(message)
 
@@ -14,6 +20,7 @@ class CustomError(Exception):
 
         self.status_code = status_code
         self.message = message
+        self.headers = headers
 
     def to_response(self):
         return {
@@ -1,14 +1,70 @@
+import functools
+import os
+import shutil
+import stat as stat_module
+import tarfile
+import tempfile
+import threading
+import time
+import zipfile
+from collections.abc import AsyncIterator, Callable, Iterator
+from dataclasses import dataclass, field
 from pathlib import Path
-from typing import Literal
+from typing import Literal, TypeVar
 
+import anyio.to_thread
 import yaml
-
-from .env import BASE_DIR
+from fastapi import Request
+
+from .archive import (
+    CHUNK_SIZE,
+    ExportEntry,
+    export_stream,
+    iter_tar_members,
+    iter_zip_members,
+)
+from .env import (
+    BASE_DIR,
+    VAULT_IDLE_TIMEOUT,
+    VAULT_IO_CONCURRENCY,
+    VAULT_MAX_NOTES,
+    VAULTS,
+)
 from .exception import CustomError
+from .profiling import span
+from .vault_index import drop_vault_index, get_vault_index, split_lines
+
+T = TypeVar("T")
+
+# Serializes read-modify-write cycles now that handlers run in a thread pool.
+# One lock per vault, so a busy vault does not hold up writes to the others.
+_write_locks: dict[str, threading.RLock] = {}
+_write_locks_lock = threading.Lock()
+
+
+def _write_lock(base_folder: str) -> threading.RLock:
+    with _write_locks_lock:
+        return _write_locks.setdefault(base_folder, threading.RLock())
+
+
+def _serialized(method):
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with _write_lock(self.base_folder):
+            return method(self, *args, **kwargs)
+
+    return wrapper
+
+
+def file_version(stat: os.stat_result) -> str:
+    """
+    An opaque version identifier derived from a note's inode, modification time and size.
+    """
+    return f"{stat.st_ino:x}-{stat.st_mtime_ns:x}-{stat.st_size:x}"
 
 
 class FileHandler:
-    def __init__(self, base_folder: str):
+    def __init__(self, base_folder: str, max_notes: int = VAULT_MAX_NOTES):
         path = Path(base_folder)
         if not path.exists() or not path.is_dir():
             raise ValueError(
@@ -16,6 +72,17 @@ class FileHandler:
             )
 
         self.base_folder = base_folder
+        self.index = get_vault_index(base_folder, max_notes=max_notes)
+        self.io_limiter = anyio.CapacityLimiter(VAULT_IO_CONCURRENCY)
+
+    async def run_io(self, func: Callable[..., T], *args, **kwargs) -> T:
+        """
+        Runs blocking file system work in a worker thread, at most `VAULT_IO_CONCURRENCY`
+        at a time for this vault.
+        """
+        return await anyio.to_thread.run_sync(
+            functools.partial(func, *args, **kwargs), limiter=self.io_limiter
+        )
 
     def __raise_absolute_path_error(self, path: str) -> bool:
         if Path(path).is_absolute():
@@ -51,6 +118,31 @@ class FileHandler:
             )
         return False
 
+    def __raise_outside_base_error(self, path: str) -> bool:
+        full_path = (Path(self.base_folder) / path).resolve()
+        if not full_path.is_relative_to(Path(self.base_folder).resolve()):
+            raise CustomError(
+                status_code=400,
+                message="The path must stay within the base folder.",
+            )
+        return False
+
+    def __raise_not_markdown_error(self, path: str, action: str) -> bool:
+        if not path.endswith(".md"):
+            raise CustomError(
+                status_code=400,
+                message=f"Only markdown (.md) files can be {action}.",
+            )
+        return False
+
+    def __raise_hidden_error(self, path: str) -> bool:
+        if not self.__filter([Path(path)]):
+            raise CustomError(
+                status_code=404,
+                message=f"The provided file_path '{path}' is not a valid file within the base folder.",
+            )
+        return False
+
     def __filter(self, items: list[Path]) -> list[Path]:
         items = filter(
             lambda x: not any(part.startswith(".") for part in x.parts), items
@@ -59,71 +151,120 @@ class FileHandler:
         return list(items)
 
     def list_files(self, file_path: str, all: bool = False) -> list[str]:
-        self.__raise_absolute_path_error(file_path)
-        self.__raise_not_exist_error(file_path)
-        self.__raise_not_dir_error(file_path)
+        with span("validation"):
+            self.__raise_absolute_path_error(file_path)
+            self.__raise_not_exist_error(file_path)
+            self.__raise_not_dir_error(file_path)
 
         full_path = Path(self.base_folder) / file_path
 
-        if all:
-            files = [
-                p.relative_to(self.base_folder)
-                for p in full_path.rglob("*.md")
-                if p.is_file()
-            ]
-        else:
-            files = [
-                p.relative_to(self.base_folder)
-                for p in full_path.iterdir()
-                if p.suffix == ".md" and p.is_file()
-            ]
-
-        return self.__filter(files)
+        with span("walk"):
+            if all:
+                files = [
+                    p.relative_to(self.base_folder)
+                    for p in full_path.rglob("*.md")
+                    if p.is_file()
+                ]
+            else:
+                files = [
+                    p.relative_to(self.base_folder)
+                    for p in full_path.iterdir()
+                    if p.suffix == ".md" and p.is_file()
+                ]
+
+        with span("filter"):
+            return self.__filter(files)
 
     def list_dirs(self, dir_path: str, all: bool = False) -> list[str]:
-        self.__raise_absolute_path_error(dir_path)
-        self.__raise_not_exist_error(dir_path)
-        self.__raise_not_dir_error(dir_path)
+        with span("validation"):
+            self.__raise_absolute_path_error(dir_path)
+            self.__raise_not_exist_error(dir_path)
+            self.__raise_not_dir_error(dir_path)
 
         full_path = Path(self.base_folder) / dir_path
 
-        if all:
-            dirs = [
-                p.relative_to(self.base_folder)
-                for p in full_path.rglob("*")
-                if p.is_dir()
-            ]
-            return self.__filter(dirs)
-        else:
-            dirs = [
-                p.relative_to(self.base_folder)
-                for p in full_path.iterdir()
-                if p.is_dir()
-            ]
+        with span("walk"):
+            if all:
+                dirs = [
+                    p.relative_to(self.base_folder)
+                    for p in full_path.rglob("*")
+                    if p.is_dir()
+                ]
+            else:
+                dirs = [
+                    p.relative_to(self.base_folder)
+                    for p in full_path.iterdir()
+                    if p.is_dir()
+                ]
+
+        with span("filter"):
             return self.__filter(dirs)
 
     def read_file(self, file_path: str) -> list[str]:
-        self.__raise_absolute_path_error(file_path)
-        self.__raise_not_exist_error(file_path)
-        self.__raise_not_file_error(file_path)
+        return self.read_file_version(file_path)[0]
 
-        if not file_path.endswith(".md"):
-            raise CustomError(
-                status_code=400,
-                message="Only markdown (.md) files can be read.",
-            )
+    def read_file_version(self, file_path: str) -> tuple[list[str], str]:
+        """
+        Returns the lines of a note together with the version of the bytes that were
+        read, taken from the open file rather than a separate stat call.
+        """
+        with span("validation"):
+            self.__raise_absolute_path_error(file_path)
+            self.__raise_outside_base_error(file_path)
+            self.__raise_not_exist_error(file_path)
+            self.__raise_not_file_error(file_path)
+            self.__raise_hidden_error(file_path)
+
+        self.__raise_not_markdown_error(file_path, "read")
 
         full_path = Path(self.base_folder) / file_path
 
-        with open(full_path, "r", encoding="utf-8") as f:
-            content = f.read()
+        with span("file_read"):
+            with open(full_path, "rb") as f:
+                data = f.read()
+                stat = os.fstat(f.fileno())
 
-        lines = content.splitlines()
+        with span("line_split"):
+            lines = split_lines(data.decode("utf-8"))
 
-        return lines
+        with span("index"):
+            self.index.observe(file_path, data, lines, stat)
+
+        return lines, file_version(stat)
+
+    def read_versioned(
+        self, file_path: str, content: Literal["full", "frontmatter", "text"]
+    ) -> tuple[list[str] | dict, str]:
+        """
+        Reads a note once and returns the requested part of it with its version.
+        """
+        lines, version = self.read_file_version(file_path)
+        match content:
+            case "frontmatter":
+                return self.__frontmatter(lines), version
+            case "text":
+                return self.__text_content(lines), version
+        return lines, version
+
+    def get_attachment(self, file_path: str) -> tuple[Path, os.stat_result]:
+        """
+        Validates an attachment path and returns it with its stat result, without
+        reading the file, so it can be streamed by the response.
+        Hidden files (e.g. in `.obsidian`) are not served.
+        """
+        self.__raise_absolute_path_error(file_path)
+        self.__raise_outside_base_error(file_path)
+        self.__raise_not_exist_error(file_path)
+        self.__raise_not_file_error(file_path)
+        self.__raise_hidden_error(file_path)
+
+        full_path = Path(self.base_folder) / file_path
+        return full_path, full_path.stat()
 
     def get_frontmatter(self, file_path: str) -> dict:
-        lines = self.read_file(file_path)
+        return self.__frontmatter(self.read_file(file_path))
+
+    def __frontmatter(self, lines: list[str]) -> dict:
         frontmatter: str = []
 
         if lines[0].strip() == "---":
@@ -137,33 +278,37 @@ class FileHandler:
             return {}
 
         frontmatter_str = "\n".join(frontmatter)
-        return yaml.safe_load(frontmatter_str)
+        with span("frontmatter_parse"):
+            return yaml.safe_load(frontmatter_str)
 
     def get_text_content(self, file_path: str) -> list[str]:
-        lines = self.read_file(file_path)
+        return self.__text_content(self.read_file(file_path))
 
+    def __text_content(self, lines: list[str]) -> list[str]:
         content: list[str] = []
         status: Literal["before_frontmatter", "in_frontmatter", "after_frontmatter"] = (
             "before_frontmatter"
         )
 
-        for line in lines:
-            stripped_line = line.strip()
-            if stripped_line == "---":
-                match status:
-                    case "before_frontmatter":
-                        status = "in_frontmatter"
-                    case "in_frontmatter":
-                        status = "after_frontmatter"
-                    case "after_frontmatter":
-                        pass
-                continue
-
-            if status == "after_frontmatter" or status == "before_frontmatter":
-                content.append(line)
+        with span("body_split"):
+            for line in lines:
+                stripped_line = line.strip()
+                if stripped_line == "---":
+                    match status:
+                        case "before_frontmatter":
+                            status = "in_frontmatter"
+                        case "in_frontmatter":
+                            status = "after_frontmatter"
+                        case "after_frontmatter":
+                            pass
+                    continue
+
+                if status == "after_frontmatter" or status == "before_frontmatter":
+                    content.append(line)
 
         return content
 
+    @_serialized
     def write_file(
         self, file_path: str, frontmatter: dict | None, content: list[str] | None
     ) -> None:
@@ -196,6 +341,8 @@ class FileHandler:
         with open(full_path, "w", encoding="utf-8") as f:
             f.write("\n".join(lines))
 
+        self.index.update(file_path)
+
     def __update_file(
         self, file_path: str, frontmatter: dict | None, content: list[str] | None
     ) -> None:
@@ -229,6 +376,9 @@ class FileHandler:
         with open(full_path, "w", encoding="utf-8") as f:
             f.write("\n".join(lines))
 
+        self.index.update(file_path)
+
+    @_serialized
     def update_frontmatter(self, file_path: str, frontmatter: dict) -> None:
         original_fm = self.get_frontmatter(file_path)
 
@@ -239,11 +389,377 @@ class FileHandler:
 
         self.__update_file(file_path, updated_fm, None)
 
+    @_serialized
     def update_content(self, file_path: str, content: list[str]) -> None:
         original_fm = self.get_frontmatter(file_path)
 
         self.__update_file(file_path, original_fm, content)
 
+    def get_manifest(self, dir_path: str) -> dict:
+        self.__raise_absolute_path_error(dir_path)
+        self.__raise_not_exist_error(dir_path)
+        self.__raise_not_dir_error(dir_path)
+
+        return self.index.manifest(dir_path)
+
+    def get_version(self, file_path: str) -> str:
+        """
+        Returns an opaque version identifier for the file, derived from its inode,
+        modification time and size, so it can be checked with a single stat call.
+        """
+        self.__raise_absolute_path_error(file_path)
+        self.__raise_outside_base_error(file_path)
+        self.__raise_not_markdown_error(file_path, "versioned")
+        self.__raise_hidden_error(file_path)
+        self.__raise_not_exist_error(file_path)
+        self.__raise_not_file_error(file_path)
+
+        with span("stat"):
+            return file_version((Path(self.base_folder) / file_path).stat())
+
+    def __sort_line_operations(self, operations: list[dict]) -> list[dict]:
+        """
+        Orders the operations by line (inserts before deletes/replaces on the same
+        line) and rejects operations with invalid or overlapping line ranges.
+        """
+        operations = sorted(
+            operations, key=lambda op: (op["line"], op["op"] != "insert")
+        )
+
+        range_end = 0
+        for op in operations:
+            if op["line"] < 0:
+                raise CustomError(
+                    status_code=400,
+                    message=f"Invalid line number {op['line']}.",
+                )
+            if op["line"] < range_end:
+                raise CustomError(
+                    status_code=400,
+                    message=f"The operation at line {op['line']} overlaps a previous operation.",
+                )
+            if op["op"] != "insert":
+                if op.get("count", 1) < 1:
+                    raise CustomError(
+                        status_code=400,
+                        message=f"The operation at line {op['line']} must affect at least one line.",
+                    )
+                range_end = op["line"] + op.get("count", 1)
+
+        return operations
+
+    @_serialized
+    def patch_lines(
+        self, file_path: str, base_version: str, operations: list[dict]
+    ) -> str:
+        """
+        Applies line operations to the file in a single streaming pass and returns the new version.
+        - Each operation is a dict with "op" ("insert", "delete" or "replace"), "line",
+          and optionally "count" (default 1) and "content".
+        - Line numbers are 0-based indices into the lines of the base version, as returned
+          by `read_file`. Inserting at the line count appends to the file.
+        - Untouched lines keep their original line ending. New lines use the ending of
+          the first line of the file.
+        - The patch is rejected if the file no longer matches `base_version`.
+        """
+        self.__raise_absolute_path_error(file_path)
+        self.__raise_outside_base_error(file_path)
+        self.__raise_not_markdown_error(file_path, "patched")
+        self.__raise_hidden_error(file_path)
+
+        self.__raise_not_exist_error(file_path)
+        self.__raise_not_file_error(file_path)
+
+        operations = self.__sort_line_operations(operations)
+
+        full_path = Path(self.base_folder) / file_path
+        fd, tmp_path = tempfile.mkstemp(
+            dir=full_path.parent, prefix=f".{full_path.name}."
+        )
+
+        try:
+            with open(full_path, "rb") as src, open(fd, "wb") as dst:
+                # Checked on the open file, so the line numbers refer to what is read.
+                if file_version(os.fstat(src.fileno())) != base_version:
+                    raise CustomError(
+                        status_code=409,
+                        message=f"The file '{file_path}' has changed since version '{base_version}'.",
+                    )
+
+                # New lines use the line ending of the first line, so CRLF notes stay CRLF.
+                newline = b"\n"
+                # Each line is written once the next one is known, as the line ending
+                # of the last line depends on whether the file ended with one.
+                last: tuple[bytes, bytes] | None = None
+
+                def emit(content: bytes, ending: bytes) -> None:
+                    nonlocal last
+                    if last is not None:
+                        dst.write(last[0] + (last[1] or newline))
+                    last = (content, ending)
+
+                pending = iter(operations)
+                op = next(pending, None)
+                skip_until = 0
+                line_count = 0
+                trailing_newline = False
+
+                # Binary iteration splits on b"\n" only, like `split_lines`.
+                for index, raw_line in enumerate(src):
+                    line_count = index + 1
+                    trailing_newline = raw_line.endswith(b"\n")
+                    content = raw_line.removesuffix(b"\n")
+                    ending = raw_line[len(content) :]
+                    if content.endswith(b"\r"):
+                        content, ending = content[:-1], b"\r" + ending
+                    if index == 0 and ending:
+                        newline = ending
+
+                    while op is not None and op["line"] == index:
+                        if op["op"] != "delete":
+                            for new_line in op.get("content") or []:
+                                emit(new_line.encode("utf-8"), newline)
+                        if op["op"] != "insert":
+                            skip_until = index + op.get("count", 1)
+                        op = next(pending, None)
+
+                    if index < skip_until:
+                        continue
+
+                    emit(content, ending)
+
+                while op is not None and op["line"] == line_count:
+                    if op["op"] != "insert":
+                        break
+                    for new_line in op.get("content") or []:
+                        emit(new_line.encode("utf-8"), newline)
+                    op = next(pending, None)
+
+                if op is not None or skip_until > line_count:
+                    raise CustomError(
+                        status_code=400,
+                        message=f"The operations exceed the {line_count} lines of '{file_path}'.",
+                    )
+
+                if last is not None:
+                    ending = (last[1] or newline) if trailing_newline else b""
+                    dst.write(last[0] + ending)
+                dst.flush()
+                version = file_version(os.fstat(dst.fileno()))
+
+            os.chmod(tmp_path, full_path.stat().st_mode)
+            os.replace(tmp_path, full_path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+        self.index.update(file_path)
+
+        return version
+
+    def __iter_export_entries(
+        self, root: Path, since: float | None
+    ) -> Iterator[ExportEntry]:
+        for current, dirnames, filenames in os.walk(root):
+            dirnames[:] = sorted(d for d in dirnames if not d.startswith("."))
+            for name in sorted(filenames):
+                if name.startswith("."):
+                    continue
+                full_path = Path(current) / name
+                try:
+                    stat = full_path.lstat()
+                except FileNotFoundError:
+                    continue
+                # Symlinks are skipped, as they may point outside the base folder.
+                if not stat_module.S_ISREG(stat.st_mode):
+                    continue
+                if since is not None and stat.st_mtime < since:
+                    continue
+                yield full_path, full_path.relative_to(root).as_posix(), stat
+
+    def export_archive(
+        self, dir_path: str, format: str, since: float | None = None
+    ) -> Iterator[bytes]:
+        """
+        Returns a generator that streams the non-hidden files below `dir_path` as an
+        archive, optionally only those modified at or after `since` (a Unix timestamp).
+        Archive member names are relative to `dir_path`.
+        """
+        self.__raise_absolute_path_error(dir_path)
+        self.__raise_outside_base_error(dir_path)
+        self.__raise_not_exist_error(dir_path)
+        self.__raise_not_dir_error(dir_path)
+
+        root = Path(self.base_folder) / dir_path
+        if dir_path and not self.__filter([Path(dir_path)]):
+            return export_stream([], format)
+
+        return export_stream(self.__iter_export_entries(root, since), format)
+
+    def import_archive(self, dir_path: str, format: str, fileobj) -> dict:
+        """
+        Unpacks an archive read from `fileobj` into `dir_path`, one member at a time.
+        - Hidden target directories (e.g. `.obsidian`) are refused.
+        - Hidden, absolute and `..` member paths are skipped, as are members that would
+          land outside the base folder through a symlinked directory.
+        - Existing files are skipped, as overwriting is not allowed.
+        - Zip archives need random access, so they are spooled to a temporary file first.
+        """
+        self.__raise_absolute_path_error(dir_path)
+        self.__raise_outside_base_error(dir_path)
+        self.__raise_not_exist_error(dir_path)
+        self.__raise_not_dir_error(dir_path)
+        self.__raise_hidden_error(dir_path)
+
+        base = Path(self.base_folder).resolve()
+        root = Path(self.base_folder) / dir_path
+        written: list[str] = []
+        skipped: list[str] = []
+
+        with tempfile.TemporaryFile() as spool:
+            try:
+                if format == "zip":
+                    shutil.copyfileobj(fileobj, spool, CHUNK_SIZE)
+                    spool.seek(0)
+                    members = iter_zip_members(spool)
+                else:
+                    members = iter_tar_members(fileobj)
+
+                for name, src in members:
+                    relative = Path(name)
+                    if relative.is_absolute() or any(
+                        part.startswith(".") for part in relative.parts
+                    ):
+                        skipped.append(name)
+                        continue
+
+                    target = root / relative
+                    if not target.resolve().is_relative_to(base):
+                        skipped.append(name)
+                        continue
+                    target.parent.mkdir(parents=True, exist_ok=True)
+                    try:
+                        with open(target, "xb") as dst:
+                            try:
+                                shutil.copyfileobj(src, dst, CHUNK_SIZE)
+                            except BaseException:
+                                target.unlink()
+                                raise
+                    except FileExistsError:
+                        skipped.append(name)
+                        continue
+
+                    written.append(relative.as_posix())
+                    self.index.update((Path(dir_path) / relative).as_posix())
+            except (tarfile.TarError, zipfile.BadZipFile, EOFError) as e:
+                raise CustomError(
+                    status_code=400,
+                    message=f"The archive could not be read: {e}",
+                ) from e
+
+        return {"written": written, "skipped": skipped}
+
+
+DEFAULT_VAULT = "default"
+
+
+@dataclass
+class Vault:
+    name: str
+    base_folder: str
+    max_notes: int
+    handler: FileHandler | None = None
+    last_used: float = field(default_factory=time.monotonic)
+    active: int = 0
+    evicted: bool = False
+
+    def to_response(self) -> dict:
+        return {
+            "name": self.name,
+            "loaded": self.handler is not None,
+            "max_notes": self.max_notes,
+            "notes_indexed": len(self.handler.index) if self.handler else 0,
+            "active_requests": self.active,
+            "idle_seconds": (
+                round(time.monotonic() - self.last_used, 1) if self.handler else None
+            ),
+        }
+
+
+class VaultRegistry:
+    """
+    The vaults served by this process, keyed by name.
+    - A vault's handler, index and I/O limiter are created on first use (its index
+      may already have been built by the startup warmup).
+    - Vaults without requests for `idle_timeout` seconds are unloaded the next time
+      any vault is opened, which releases their index.
+    """
+
+    def __init__(self, vaults: dict[str, tuple[str, int]], idle_timeout: float):
+        self.vaults = {
+            name: Vault(name=name, base_folder=base_folder, max_notes=max_notes)
+            for name, (base_folder, max_notes) in vaults.items()
+        }
+        self.idle_timeout = idle_timeout
+        self._lock = threading.Lock()
+
+    def __evict_idle(self, now: float) -> None:
+        for vault in self.vaults.values():
+            if (
+                not vault.evicted
+                and vault.active == 0
+                and now - vault.last_used > self.idle_timeout
+            ):
+                vault.handler = None
+                vault.evicted = True
+                drop_vault_index(vault.base_folder)
+
+    def acquire(self, name: str) -> FileHandler:
+        vault = self.vaults.get(name)
+        if vault is None:
+            raise CustomError(
+                status_code=404, message=f"The vault '{name}' does not exist."
+            )
 
-def get_file_handler(base_folder: str = BASE_DIR) -> FileHandler:
-    return FileHandler(base_folder=base_folder)
+        with self._lock:
+            now = time.monotonic()
+            self.__evict_idle(now)
+            if vault.handler is None:
+                try:
+                    vault.handler = FileHandler(
+                        base_folder=vault.base_folder, max_notes=vault.max_notes
+                    )
+                except ValueError:
+                    raise CustomError(
+                        status_code=503,
+                        message=f"The vault '{name}' is not available.",
+                    ) from None
+            vault.active += 1
+            vault.evicted = False
+            vault.last_used = now
+            return vault.handler
+
+    def release(self, name: str) -> None:
+        with self._lock:
+            vault = self.vaults[name]
+            vault.active -= 1
+            vault.last_used = time.monotonic()
+
+    def stats(self) -> list[dict]:
+        with self._lock:
+            return [vault.to_response() for vault in self.vaults.values()]
+
+
+vaults = VaultRegistry(
+    {DEFAULT_VAULT: (BASE_DIR, VAULT_MAX_NOTES), **VAULTS}, VAULT_IDLE_TIMEOUT
+)
+
+
+async def get_file_handler(request: Request) -> AsyncIterator[FileHandler]:
+    name = request.path_params.get("vault", DEFAULT_VAULT)
+    # Opening a vault may create its index, which touches the disk.
+    fh = await anyio.to_thread.run_sync(vaults.acquire, name)
+    try:
+        yield fh
+    finally:
+        vaults.release(name)
@@ -0,0 +1,102 @@
+import json
+import logging
+import random
+import sys
+import time
+
+from loguru import logger
+
+from .env import ACCESS_LOG, ACCESS_LOG_SAMPLE_RATE, LOG_LEVEL
+
+
+def is_app_record(record) -> bool:
+    return record["name"].startswith("app") and "access" not in record["extra"]
+
+
+def is_access_record(record) -> bool:
+    return "access" in record["extra"]
+
+
+def silence_uvicorn_access_log() -> None:
+    """
+    Turns off uvicorn's access logger, which writes synchronously on the event loop.
+    Without handlers uvicorn skips building its access lines altogether.
+    """
+    access_logger = logging.getLogger("uvicorn.access")
+    access_logger.handlers.clear()
+    access_logger.propagate = False
+    access_logger.disabled = True
+
+
+def configure_logging() -> None:
+    """
+    Replaces loguru's default handler with queued sinks: application logs go to
+    stderr, JSON access logs to stdout. With `enqueue=True` the sink writes happen
+    on loguru's background thread, never inside a request handler.
+    uvicorn's own access log is turned off, as `AccessLogMiddleware` replaces it.
+    """
+    silence_uvicorn_access_log()
+    logger.remove()
+    logger.add(
+        sys.stderr,
+        format="{time} {level} {name} {message}",
+        filter=is_app_record,
+        level=LOG_LEVEL,
+        enqueue=True,
+    )
+    if ACCESS_LOG:
+        logger.add(
+            sys.stdout,
+            format="{extra[access]}",
+            filter=is_access_record,
+            level="INFO",
+            enqueue=True,
+        )
+
+
+class AccessLogMiddleware:
+    """
+    Writes one JSON access log line per request with its timing.
+    Successful responses are sampled at `ACCESS_LOG_SAMPLE_RATE`; errors are always logged.
+    The line is built after the response has been sent.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not ACCESS_LOG:
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+        response_bytes = 0
+
+        async def send_and_measure(message):
+            nonlocal status_code, response_bytes
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            elif message["type"] == "http.response.body":
+                response_bytes += len(message.get("body", b""))
+            await send(message)
+
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_and_measure)
+        finally:
+            duration = time.perf_counter() - start
+            if status_code >= 400 or random.random() < ACCESS_LOG_SAMPLE_RATE:
+                client = scope.get("client")
+                access = json.dumps(
+                    {
+                        "ts": time.time(),
+                        "method": scope["method"],
+                        "path": scope["path"],
+                        "query": scope.get("query_string", b"").decode("latin-1"),
+                        "status": status_code,
+                        "duration_ms": round(duration * 1000, 3),
+                        "bytes": response_bytes,
+                        "client": client[0] if client else None,
+                    }
+                )
+                logger.bind(access=access).info("access")
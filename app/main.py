@@ -1,20 +1,82 @@
-import sys
+import asyncio
+from contextlib import asynccontextmanager
 
-from fastapi import FastAPI
+from fastapi import FastAPI, Header, Request, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse
 from loguru import logger
 
+from .admission import admission
+from .env import (
+    HOT_NOTES_FILE,
+    HOT_NOTES_LIMIT,
+    INDEX_REFRESH_INTERVAL,
+    WARMUP_NOTES,
+)
+from .exception import CustomError
+from .file_handler import DEFAULT_VAULT, vaults
+from .log import AccessLogMiddleware, configure_logging
+from .profiling import ProfilingMiddleware, find_profile, is_authorized
 from .router import router
+from .shared_index import claim_ownership
+from .vault_index import refresh_indexes_periodically
+from .warmup import Warmup, WarmupState, load_hot_notes, save_hot_notes
+
+# Hot notes are recorded by path only, so they are preloaded in the default vault.
+hot_notes = WARMUP_NOTES + (load_hot_notes(HOT_NOTES_FILE) if HOT_NOTES_FILE else [])
+warmups = {
+    name: Warmup(
+        base_folder=vault.base_folder,
+        hot_notes=hot_notes if name == DEFAULT_VAULT else [],
+        max_notes=vault.max_notes,
+    )
+    for name, vault in vaults.vaults.items()
+}
+
+
+async def warm_up_vaults(refresh: bool) -> None:
+    # One vault at a time, so startup does not walk every vault at once.
+    for warmup in warmups.values():
+        await warmup.run(refresh=refresh)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Configured here rather than at import, as it replaces the process-wide handlers.
+    configure_logging()
+    for warmup in warmups.values():
+        warmup.state = WarmupState()
+    # With several workers, only the one owning the shared indexes walks the vaults.
+    warmer = asyncio.create_task(warm_up_vaults(refresh=claim_ownership()))
+    refresher = asyncio.create_task(
+        refresh_indexes_periodically(
+            INDEX_REFRESH_INTERVAL,
+            claim_ownership,
+            {vault.base_folder: vault.max_notes for vault in vaults.vaults.values()},
+        )
+    )
+    yield
+    warmer.cancel()
+    refresher.cancel()
+    if HOT_NOTES_FILE:
+        await run_in_threadpool(save_hot_notes, HOT_NOTES_FILE, HOT_NOTES_LIMIT)
+    await logger.complete()
 
-app = FastAPI()
+
+app = FastAPI(lifespan=lifespan)
 
 app.include_router(router, prefix="/v1/files")
+app.include_router(router, prefix="/v1/vaults/{vault}/files")
+app.add_middleware(ProfilingMiddleware)
+app.add_middleware(AccessLogMiddleware)
 
-logger.add(
-    sys.stderr,
-    format="{time} {level} {message}",
-    filter="obsidian-file-api",
-    level="INFO",
-)
+
+@app.exception_handler(CustomError)
+async def custom_error_handler(request: Request, ce: CustomError):
+    logger.error("CustomError in {}: {}", request.url.path, ce.message)
+    return JSONResponse(
+        status_code=ce.status_code, content=ce.to_response(), headers=ce.headers
+    )
 
 
 @app.get("/")
@@ -22,3 +84,47 @@ async def read_root():
     return {
         "message": "Welcome to the File Listing API!",
     }
+
+
+@app.get("/healthz")
+async def healthz():
+    return {"status": "ok"}
+
+
+@app.get("/readyz")
+async def readyz(response: Response):
+    # Ready once every vault has been warmed up. Only the default vault has to
+    # succeed, so one broken extra vault does not take the others out of rotation.
+    ready = warmups[DEFAULT_VAULT].state.ready and all(
+        warmup.state.finished for warmup in warmups.values()
+    )
+    if not ready:
+        response.status_code = 503
+    return {
+        "ready": ready,
+        "vaults": {
+            name: warmup.state.to_response() for name, warmup in warmups.items()
+        },
+    }
+
+
+@app.get("/admission")
+async def admission_stats():
+    return admission.stats()
+
+
+@app.get("/v1/vaults")
+async def list_vaults():
+    return vaults.stats()
+
+
+@app.get("/debug/profiles/{profile_id}")
+async def get_profile(profile_id: str, x_profile: str | None = Header(None)):
+    if not is_authorized(x_profile):
+        raise CustomError(status_code=403, message="Profiling is not authorized.")
+    profile = find_profile(profile_id)
+    if profile is None:
+        raise CustomError(
+            status_code=404, message=f"The profile '{profile_id}' does not exist."
+        )
+    return profile
@@ -0,0 +1,248 @@
+import hmac
+import json
+import os
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter, OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from loguru import logger
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import Headers
+
+from .env import PROFILING_TOKEN, SHARED_INDEX_DIR, SLOW_REQUEST_MS
+
+MAX_STORED_PROFILES = 32
+
+_spans: ContextVar[list[tuple[str, float]] | None] = ContextVar("spans", default=None)
+_sampler: ContextVar["Sampler | None"] = ContextVar("sampler", default=None)
+
+
+@contextmanager
+def span(name: str):
+    """
+    Records how long the enclosed block took as a phase of the current request.
+    Outside of a request this is a no-op.
+    """
+    spans = _spans.get()
+    if spans is None:
+        yield
+        return
+
+    sampler = _sampler.get()
+    thread_id = threading.get_ident()
+    if sampler is not None:
+        sampler.watch(thread_id)
+
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        spans.append((name, time.perf_counter() - start))
+        if sampler is not None:
+            sampler.unwatch(thread_id)
+
+
+class Sampler(threading.Thread):
+    """
+    Statistical profiler that periodically samples the stacks of the threads
+    working on one request and counts identical stacks.
+    A thread is only sampled while it is inside one of the request's spans, so idle
+    time of the event loop and work of other requests on a shared thread are left out.
+    """
+
+    def __init__(self, interval: float = 0.001):
+        super().__init__(daemon=True)
+        self.interval = interval
+        # Watched threads with the number of spans they are in (spans may nest).
+        self.threads: Counter[int] = Counter()
+        self.samples: Counter[str] = Counter()
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+
+    def watch(self, thread_id: int) -> None:
+        with self._lock:
+            self.threads[thread_id] += 1
+
+    def unwatch(self, thread_id: int) -> None:
+        with self._lock:
+            self.threads[thread_id] -= 1
+            if self.threads[thread_id] <= 0:
+                del self.threads[thread_id]
+
+    def run(self) -> None:
+        while not self._stopped.wait(self.interval):
+            frames = sys._current_frames()
+            with self._lock:
+                thread_ids = list(self.threads)
+            for thread_id in thread_ids:
+                frame = frames.get(thread_id)
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    filename = os.path.basename(code.co_filename)
+                    stack.append(f"{code.co_name} ({filename}:{frame.f_lineno})")
+                    frame = frame.f_back
+                if stack:
+                    self.samples[";".join(reversed(stack))] += 1
+
+    def stop(self) -> None:
+        self._stopped.set()
+        self.join()
+
+    def report(self, top: int = 50) -> dict:
+        return {
+            "interval_ms": self.interval * 1000,
+            "samples": sum(self.samples.values()),
+            "stacks": [
+                {"stack": stack, "count": count}
+                for stack, count in self.samples.most_common(top)
+            ],
+        }
+
+
+profiles: OrderedDict[str, dict] = OrderedDict()
+
+
+def _profile_dir() -> str:
+    return os.path.join(SHARED_INDEX_DIR, "profiles")
+
+
+def _mtime(path: str) -> float:
+    try:
+        return os.stat(path).st_mtime
+    except FileNotFoundError:
+        return 0.0
+
+
+def write_profile(profile_id: str, profile: dict) -> None:
+    """
+    Writes a report to SHARED_INDEX_DIR, where every worker can find it, and removes
+    all but the last `MAX_STORED_PROFILES`.
+    """
+    directory = _profile_dir()
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"{profile_id}.json")
+    with open(f"{path}.tmp", "w", encoding="utf-8") as f:
+        json.dump(profile, f)
+    os.replace(f"{path}.tmp", path)
+
+    stored = [
+        os.path.join(directory, name)
+        for name in os.listdir(directory)
+        if name.endswith(".json")
+    ]
+    for old in sorted(stored, key=_mtime)[:-MAX_STORED_PROFILES]:
+        try:
+            os.remove(old)
+        except FileNotFoundError:
+            pass
+
+
+def find_profile(profile_id: str) -> dict | None:
+    if profile_id in profiles:
+        return profiles[profile_id]
+    if not SHARED_INDEX_DIR or not re.fullmatch(r"[0-9a-f]{32}", profile_id):
+        return None
+    try:
+        with open(
+            os.path.join(_profile_dir(), f"{profile_id}.json"), encoding="utf-8"
+        ) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def breakdown(spans: list[tuple[str, float]], total: float) -> dict[str, float]:
+    phases: dict[str, float] = {}
+    for name, duration in spans:
+        phases[name] = phases.get(name, 0.0) + duration * 1000
+    phases["other"] = total * 1000 - sum(phases.values())
+    return {name: round(ms, 3) for name, ms in phases.items()}
+
+
+def is_authorized(token: str | None) -> bool:
+    return bool(PROFILING_TOKEN) and hmac.compare_digest(
+        (token or "").encode(), PROFILING_TOKEN.encode()
+    )
+
+
+class ProfilingMiddleware:
+    """
+    Collects the spans recorded while handling each request.
+    - Requests slower than `SLOW_REQUEST_MS` are logged with their phase breakdown.
+    - Requests carrying `X-Profile: <PROFILING_TOKEN>` are also sampled. The response
+      gets an `X-Profile-Id` header, and the report can be fetched from
+      `/debug/profiles/{id}` with the same header, from any worker.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        spans: list[tuple[str, float]] = []
+        spans_token = _spans.set(spans)
+
+        sampler = None
+        profile_id = None
+        if is_authorized(Headers(scope=scope).get("x-profile")):
+            sampler = Sampler()
+            sampler.start()
+            profile_id = uuid.uuid4().hex
+        sampler_token = _sampler.set(sampler)
+
+        status_code = 500
+
+        async def send_with_profile_id(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                if profile_id is not None:
+                    message["headers"] = [
+                        *message.get("headers", []),
+                        (b"x-profile-id", profile_id.encode()),
+                    ]
+            await send(message)
+
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_profile_id)
+        finally:
+            total = time.perf_counter() - start
+            _spans.reset(spans_token)
+            _sampler.reset(sampler_token)
+            phases = breakdown(spans, total)
+
+            if sampler is not None:
+                sampler.stop()
+                profile = {
+                    "method": scope["method"],
+                    "path": scope["path"],
+                    "status_code": status_code,
+                    "duration_ms": round(total * 1000, 3),
+                    "phases": phases,
+                    **sampler.report(),
+                }
+                profiles[profile_id] = profile
+                while len(profiles) > MAX_STORED_PROFILES:
+                    profiles.popitem(last=False)
+                if SHARED_INDEX_DIR:
+                    await run_in_threadpool(write_profile, profile_id, profile)
+
+            if 0 <= SLOW_REQUEST_MS <= total * 1000:
+                logger.warning(
+                    "Slow request {} {} ({}) took {:.1f} ms: {}",
+                    scope["method"],
+                    scope["path"],
+                    status_code,
+                    total * 1000,
+                    phases,
+                )
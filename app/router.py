@@ -1,11 +1,22 @@
+import io
+from datetime import date, datetime
+from email.utils import parsedate
+from pathlib import Path
 from typing import Literal, Optional
 
-from fastapi import APIRouter, Depends, Response
+from fastapi import APIRouter, Depends, Query, Request, Response
+from fastapi.responses import FileResponse, JSONResponse, StreamingResponse
 from loguru import logger
 from pydantic import BaseModel
+from starlette.datastructures import Headers
+from starlette.staticfiles import NotModifiedResponse
 
+from .admission import admission, admit
+from .archive import CHUNK_SIZE, MEDIA_TYPES, RequestReader
 from .exception import CustomError
 from .file_handler import FileHandler, get_file_handler
+from .profiling import span
+from .warmup import record_read
 
 
 class FileContent(BaseModel):
@@ -13,10 +24,47 @@ class FileContent(BaseModel):
     content: Optional[list[str]]
 
 
-router = APIRouter()
+class LineOperation(BaseModel):
+    op: Literal["insert", "delete", "replace"]
+    line: int
+    count: int = 1
+    content: Optional[list[str]] = None
 
 
-@router.get("/")
+class FilePatch(BaseModel):
+    base_version: str
+    operations: list[LineOperation]
+
+
+def listing_class(request: Request) -> str:
+    list_type = request.query_params.get("type", "files_all")
+    return "listing" if list_type.endswith("_all") else "interactive"
+
+
+def is_not_modified(response_headers: Headers, request_headers: Headers) -> bool:
+    if if_none_match := request_headers.get("if-none-match"):
+        etags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+        return "*" in etags or response_headers["etag"] in etags
+
+    if_modified_since = parsedate(request_headers.get("if-modified-since", ""))
+    last_modified = parsedate(response_headers["last-modified"])
+    return (
+        if_modified_since is not None
+        and last_modified is not None
+        and if_modified_since >= last_modified
+    )
+
+
+class SpanJSONResponse(JSONResponse):
+    def render(self, content) -> bytes:
+        with span("serialization"):
+            return super().render(content)
+
+
+router = APIRouter(default_response_class=SpanJSONResponse)
+
+
+@router.get("/", dependencies=[Depends(admit(listing_class))])
 async def list_files(
     resp: Response,
     path: str = "",
@@ -26,25 +74,25 @@ async def list_files(
     try:
         match type:
             case "dirs":
-                files = fh.list_dirs(path)
+                files = await fh.run_io(fh.list_dirs, path)
             case "dirs_all":
-                files = fh.list_dirs(path, all=True)
+                files = await fh.run_io(fh.list_dirs, path, all=True)
             case "files":
-                files = fh.list_files(path)
+                files = await fh.run_io(fh.list_files, path)
             case "files_all":
-                files = fh.list_files(path, all=True)
+                files = await fh.run_io(fh.list_files, path, all=True)
         return files
     except CustomError as ce:
-        logger.error(f"CustomError in list_files: {ce.message}")
+        logger.error("CustomError in list_files: {}", ce.message)
         resp.status_code = ce.status_code
         return ce.to_response()
     except Exception as e:
-        logger.error(f"Unexpected error in list_files: {e}")
+        logger.error("Unexpected error in list_files: {}", e)
         resp.status_code = 500
         return {"error": "An unexpected error occurred."}
 
 
-@router.get("/read")
+@router.get("/read", dependencies=[Depends(admit("interactive"))])
 async def read_file(
     response: Response,
     path: str,
@@ -52,28 +100,120 @@ async def read_file(
     fh: FileHandler = Depends(get_file_handler),
 ):
     try:
-        match content:
-            case "text":
-                file_content = fh.get_text_content(path)
-                return {"content": file_content}
-            case "full":
-                file_content = fh.read_file(path)
-                return {"content": file_content}
-            case "frontmatter":
-                frontmatter = fh.get_frontmatter(path)
-                return {"frontmatter": frontmatter}
+        file_content, version = await fh.run_io(fh.read_versioned, path, content)
+        record_read(path)
+        key = "frontmatter" if content == "frontmatter" else "content"
+        return {key: file_content, "version": version}
+    except CustomError as ce:
+        response.status_code = ce.status_code
+        logger.error("CustomError in read_file: {}", ce.message)
+        return ce.to_response()
+    except Exception as e:
+        response.status_code = 500
+        logger.error("Unexpected error in read_file: {}", e)
+        return {"error": "An unexpected error occurred."}
+
+
+@router.get("/attachment")
+async def read_attachment(
+    request: Request,
+    response: Response,
+    path: str,
+    fh: FileHandler = Depends(get_file_handler),
+):
+    # The slot only covers validation: a dependency would hold it until the whole
+    # (possibly large and slow) download is sent, starving note reads.
+    async with admission.slot("interactive"):
+        try:
+            full_path, stat = await fh.run_io(fh.get_attachment, path)
+        except CustomError as ce:
+            logger.error("CustomError in read_attachment: {}", ce.message)
+            response.status_code = ce.status_code
+            return ce.to_response()
+        except Exception as e:
+            logger.error("Unexpected error in read_attachment: {}", e)
+            response.status_code = 500
+            return {"error": "An unexpected error occurred."}
+
+    # FileResponse streams the file in chunks (or via pathsend) and handles Range,
+    # ETag and Last-Modified; only the conditional 304 is left to us.
+    file_response = FileResponse(full_path, stat_result=stat)
+    if is_not_modified(file_response.headers, request.headers):
+        return NotModifiedResponse(file_response.headers)
+    return file_response
+
+
+@router.get("/manifest", dependencies=[Depends(admit("interactive"))])
+async def get_manifest(
+    response: Response,
+    path: str = "",
+    fh: FileHandler = Depends(get_file_handler),
+):
+    try:
+        return await fh.run_io(fh.get_manifest, path)
+    except CustomError as ce:
+        logger.error("CustomError in get_manifest: {}", ce.message)
+        response.status_code = ce.status_code
+        return ce.to_response()
+    except Exception as e:
+        logger.error("Unexpected error in get_manifest: {}", e)
+        response.status_code = 500
+        return {"error": "An unexpected error occurred."}
+
+
+@router.get("/tasks", dependencies=[Depends(admit("interactive"))])
+async def list_tasks(
+    response: Response,
+    path: str = "",
+    status: Literal["open", "done", "all"] = "all",
+    tag: Optional[str] = None,
+    due_before: Optional[date] = None,
+    offset: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=1000),
+    fh: FileHandler = Depends(get_file_handler),
+):
+    try:
+        total, tasks = await fh.run_io(
+            fh.index.query_tasks,
+            status=status,
+            path=path,
+            tag=tag,
+            due_before=due_before.isoformat() if due_before else None,
+            offset=offset,
+            limit=limit,
+        )
+        return {"total": total, "offset": offset, "limit": limit, "tasks": tasks}
+    except CustomError as ce:
+        logger.error("CustomError in list_tasks: {}", ce.message)
+        response.status_code = ce.status_code
+        return ce.to_response()
+    except Exception as e:
+        logger.error("Unexpected error in list_tasks: {}", e)
+        response.status_code = 500
+        return {"error": "An unexpected error occurred."}
 
+
+@router.get("/search", dependencies=[Depends(admit("interactive"))])
+async def search_files(
+    response: Response,
+    q: str,
+    limit: int = Query(10, ge=1, le=100),
+    fh: FileHandler = Depends(get_file_handler),
+):
+    try:
+        results = await fh.run_io(fh.index.search, q, limit)
+        return {"results": results}
     except CustomError as ce:
+        logger.error("CustomError in search_files: {}", ce.message)
         response.status_code = ce.status_code
-        logger.error(f"CustomError in read_file: {ce.message}")
         return ce.to_response()
     except Exception as e:
+        logger.error("Unexpected error in search_files: {}", e)
         response.status_code = 500
-        logger.error(f"Unexpected error in read_file: {e}")
         return {"error": "An unexpected error occurred."}
 
 
-@router.post("/write", status_code=201)
+@router.post("/write", status_code=201, dependencies=[Depends(admit("interactive"))])
 async def write_file(
     response: Response,
     path: str,
@@ -81,19 +221,19 @@ async def write_file(
     fh: FileHandler = Depends(get_file_handler),
 ):
     try:
-        fh.write_file(path, content.frontmatter, content.content)
+        await fh.run_io(fh.write_file, path, content.frontmatter, content.content)
         return {"status": "success"}
     except CustomError as ce:
         response.status_code = ce.status_code
-        logger.error(f"CustomError in write_file: {ce.message}")
+        logger.error("CustomError in write_file: {}", ce.message)
         return ce.to_response()
     except Exception as e:
         response.status_code = 500
-        logger.error(f"Unexpected error in write_file: {e}")
+        logger.error("Unexpected error in write_file: {}", e)
         return {"error": "An unexpected error occurred."}
 
 
-@router.patch("/write", status_code=204)
+@router.patch("/write", status_code=204, dependencies=[Depends(admit("interactive"))])
 async def update_file(
     response: Response,
     path: str,
@@ -101,20 +241,91 @@ async def update_file(
     content: FileContent,
     fh: FileHandler = Depends(get_file_handler),
 ):
-    logger.info(f"Updating file at path: {path} with type: {type}")
+    logger.debug("Updating file at path: {} with type: {}", path, type)
     try:
         match type:
             case "frontmatter":
-                fh.update_frontmatter(path, content.frontmatter)
+                await fh.run_io(fh.update_frontmatter, path, content.frontmatter)
             case "content":
-                fh.update_content(path, content.content)
+                await fh.run_io(fh.update_content, path, content.content)
 
         return {"status": "success"}
     except CustomError as ce:
-        logger.error(f"CustomError in update_file: {ce.message}")
+        logger.error("CustomError in update_file: {}", ce.message)
+        response.status_code = ce.status_code
+        return ce.to_response()
+    except Exception as e:
+        logger.error("Unexpected error in update_file: {}", e)
+        response.status_code = 500
+        return {"error": "An unexpected error occurred."}
+
+
+@router.patch("/write/lines", dependencies=[Depends(admit("interactive"))])
+async def patch_file_lines(
+    response: Response,
+    path: str,
+    patch: FilePatch,
+    fh: FileHandler = Depends(get_file_handler),
+):
+    try:
+        operations = [op.model_dump() for op in patch.operations]
+        version = await fh.run_io(fh.patch_lines, path, patch.base_version, operations)
+        return {"status": "success", "version": version}
+    except CustomError as ce:
+        logger.error("CustomError in patch_file_lines: {}", ce.message)
+        response.status_code = ce.status_code
+        return ce.to_response()
+    except Exception as e:
+        logger.error("Unexpected error in patch_file_lines: {}", e)
+        response.status_code = 500
+        return {"error": "An unexpected error occurred."}
+
+
+@router.get("/export", dependencies=[Depends(admit("bulk"))])
+async def export_files(
+    response: Response,
+    path: str = "",
+    format: Literal["tar", "zip"] = "tar",
+    since: Optional[datetime] = None,
+    fh: FileHandler = Depends(get_file_handler),
+):
+    try:
+        stream = await fh.run_io(
+            fh.export_archive, path, format, since.timestamp() if since else None
+        )
+    except CustomError as ce:
+        logger.error("CustomError in export_files: {}", ce.message)
+        response.status_code = ce.status_code
+        return ce.to_response()
+    except Exception as e:
+        logger.error("Unexpected error in export_files: {}", e)
+        response.status_code = 500
+        return {"error": "An unexpected error occurred."}
+
+    filename = f"{Path(path).name or 'vault'}.{format}"
+    return StreamingResponse(
+        stream,
+        media_type=MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+
+@router.post("/import", dependencies=[Depends(admit("bulk"))])
+async def import_files(
+    request: Request,
+    response: Response,
+    path: str = "",
+    format: Literal["tar", "zip"] = "tar",
+    fh: FileHandler = Depends(get_file_handler),
+):
+    try:
+        reader = io.BufferedReader(RequestReader(request.stream()), CHUNK_SIZE)
+        return await fh.run_io(fh.import_archive, path, format, reader)
+    except CustomError as ce:
+        logger.error("CustomError in import_files: {}", ce.message)
         response.status_code = ce.status_code
         return ce.to_response()
     except Exception as e:
-        logger.error(f"Unexpected error in update_file: {e}")
+        logger.error("Unexpected error in import_files: {}", e)
         response.status_code = 500
         return {"error": "An unexpected error occurred."}
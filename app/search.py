@@ -0,0 +1,111 @@
+import heapq
+from collections import Counter
+from pathlib import PurePosixPath
+
+
+def trigrams(text: str) -> frozenset[str]:
+    padded = f"  {text.lower()} "
+    return frozenset(padded[i : i + 3] for i in range(len(padded) - 2))
+
+
+def note_terms(file_path: str, aliases: list[str]) -> list[str]:
+    path = PurePosixPath(file_path)
+    stem_path = path.with_suffix("").as_posix()
+    return list(dict.fromkeys([path.stem, stem_path, *aliases]))
+
+
+def score_terms(
+    query: str, query_grams: frozenset[str], terms: list[tuple[str, frozenset[str]]]
+) -> tuple[float, str]:
+    """
+    Scores a note against a lowercase query by its best term: the share of the query
+    trigrams it contains, plus a bonus for an exact, prefix or substring match.
+    """
+    best = (0.0, "")
+    for term, grams in terms:
+        lowered = term.lower()
+        score = len(query_grams & grams) / len(query_grams)
+        if lowered == query:
+            score += 1.0
+        elif lowered.startswith(query):
+            score += 0.5
+        elif query in lowered:
+            score += 0.25
+        best = max(best, (score, term))
+    return best
+
+
+def rank(results: list[tuple[float, str, str]], limit: int) -> list[dict]:
+    results.sort(key=lambda r: (-r[0], len(r[1]), r[1]))
+    return [
+        {"path": file_path, "score": round(score, 4), "match": term}
+        for score, file_path, term in results[:limit]
+    ]
+
+
+class TrigramIndex:
+    """
+    Fuzzy lookup of notes by path, basename or alias.
+    - Every term of a note is split into lowercase trigrams, and each trigram
+      points at the notes that contain it.
+    - A query collects the notes sharing the most trigrams with it, then ranks those
+      candidates by trigram overlap with a bonus for exact, prefix and substring matches.
+    """
+
+    def __init__(self):
+        self.postings: dict[str, set[str]] = {}
+        self.terms: dict[str, list[tuple[str, frozenset[str]]]] = {}
+
+    def add(self, file_path: str, aliases: list[str]) -> None:
+        terms = [(term, trigrams(term)) for term in note_terms(file_path, aliases)]
+        if self.terms.get(file_path) == terms:
+            return
+
+        self.remove(file_path)
+        self.terms[file_path] = terms
+        for _, grams in terms:
+            for gram in grams:
+                self.postings.setdefault(gram, set()).add(file_path)
+
+    def remove(self, file_path: str) -> None:
+        for _, grams in self.terms.pop(file_path, ()):
+            for gram in grams:
+                postings = self.postings.get(gram)
+                if postings is None:
+                    continue
+                postings.discard(file_path)
+                if not postings:
+                    del self.postings[gram]
+
+    def search(self, query: str, limit: int = 10) -> list[dict]:
+        query = query.strip().lower()
+        if not query:
+            return []
+
+        query_grams = trigrams(query)
+        shared: Counter[str] = Counter()
+        for gram in query_grams:
+            shared.update(self.postings.get(gram, ()))
+
+        if shared:
+            candidates = [
+                file_path
+                for file_path, _ in heapq.nlargest(
+                    max(limit * 5, 50), shared.items(), key=lambda item: item[1]
+                )
+            ]
+        else:
+            # Nothing shares a trigram (e.g. a short infix), fall back to a scan.
+            candidates = [
+                file_path
+                for file_path, terms in self.terms.items()
+                if any(query in term.lower() for term, _ in terms)
+            ]
+
+        results = []
+        for file_path in candidates:
+            score, term = score_terms(query, query_grams, self.terms[file_path])
+            if score > 0:
+                results.append((score, file_path, term))
+
+        return rank(results, limit)
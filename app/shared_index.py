@@ -0,0 +1,593 @@
+import fcntl
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from dataclasses import asdict
+from io import TextIOWrapper
+from pathlib import Path
+
+from loguru import logger
+
+from .env import SHARED_INDEX_DIR, SHARED_INDEX_MMAP_SIZE
+from .exception import CustomError
+from .search import note_terms, rank, score_terms, trigrams
+from .vault_index import (
+    NoteEntry,
+    NoteIndex,
+    Task,
+    budget_error,
+    index_note,
+    is_indexable,
+    merkle_hash,
+    split_lines,
+    stat_key,
+    task_matches,
+    walk_notes,
+)
+
+# Bumped whenever SCHEMA changes. The index only caches the vault, so a file of an
+# older version is dropped and rebuilt.
+SCHEMA_VERSION = 1
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL);
+CREATE TABLE IF NOT EXISTS notes (
+    path TEXT PRIMARY KEY,
+    parent TEXT NOT NULL,
+    ino INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    hash TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS tasks (
+    path TEXT NOT NULL,
+    line INTEGER NOT NULL,
+    status TEXT NOT NULL,
+    text TEXT NOT NULL,
+    dates TEXT NOT NULL,
+    tags TEXT NOT NULL,
+    PRIMARY KEY (path, line)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS terms (
+    path TEXT NOT NULL,
+    term TEXT NOT NULL,
+    PRIMARY KEY (path, term)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS grams (
+    gram TEXT NOT NULL,
+    path TEXT NOT NULL,
+    PRIMARY KEY (gram, path)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS grams_path ON grams (path);
+CREATE INDEX IF NOT EXISTS notes_parent ON notes (parent);
+CREATE TABLE IF NOT EXISTS dirs (
+    path TEXT PRIMARY KEY,
+    parent TEXT,
+    hash TEXT
+);
+CREATE INDEX IF NOT EXISTS dirs_parent ON dirs (parent);
+"""
+
+# Notes written per transaction while a vault is (re)built.
+BATCH_SIZE = 500
+
+_owner_locks: dict[str, TextIOWrapper] = {}
+_owner_locks_lock = threading.Lock()
+
+
+def claim_ownership(directory: str = SHARED_INDEX_DIR) -> bool:
+    """
+    Elects the worker process that walks the vaults and publishes index updates.
+    The first process to lock `owner.lock` keeps it until it exits, after which the
+    next caller takes over. Without a shared index directory every process owns its
+    own indexes.
+    """
+    if not directory:
+        return True
+
+    with _owner_locks_lock:
+        if directory in _owner_locks:
+            return True
+        os.makedirs(directory, exist_ok=True)
+        # Held open for the lifetime of the process.
+        lock_file = open(os.path.join(directory, "owner.lock"), "w")  # noqa: SIM115
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            lock_file.close()
+            return False
+        _owner_locks[directory] = lock_file
+
+    logger.info("Process {} owns the shared indexes in '{}'", os.getpid(), directory)
+    return True
+
+
+def _parent(path: str) -> str:
+    parent = Path(path).parent.as_posix()
+    return "" if parent == "." else parent
+
+
+def _ancestors(path: str) -> list[str]:
+    ancestors = []
+    while path:
+        path = _parent(path)
+        ancestors.append(path)
+    return ancestors
+
+
+class SharedVaultIndex(NoteIndex):
+    """
+    Vault index kept in a SQLite file that all worker processes of a host share.
+    - It answers the same queries as `VaultIndex`, but the entries live in the file,
+      which every worker maps into memory (mmap), so the OS page cache holds a single
+      copy however many workers run.
+    - The owner process (see `claim_ownership`) walks the vault at startup and on
+      every periodic refresh. Writes through the API update their note from the worker
+      that handled them.
+    - Every published change bumps a version number. Workers cache directory manifests
+      for the version they were computed from and drop them once it changes.
+    """
+
+    def __init__(self, base_folder: str, directory: str, max_notes: int = 0):
+        self.base_folder = base_folder
+        self.max_notes = max_notes
+
+        os.makedirs(directory, exist_ok=True)
+        name = hashlib.sha256(os.path.abspath(base_folder).encode()).hexdigest()[:16]
+        self.db_path = os.path.join(directory, f"{name}.sqlite3")
+        self.lock_path = f"{self.db_path}.lock"
+
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.version = -1
+        self.manifests: dict[str, dict] = {}
+
+        self.__migrate()
+
+    def __connect(self) -> sqlite3.Connection:
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(self.db_path, timeout=60, isolation_level=None)
+            db.execute("PRAGMA journal_mode = WAL")
+            db.execute("PRAGMA synchronous = NORMAL")
+            db.execute(f"PRAGMA mmap_size = {SHARED_INDEX_MMAP_SIZE}")
+            self._local.db = db
+        return db
+
+    def __migrate(self) -> None:
+        db = self.__connect()
+        # A lock of its own, as the build lock is held for a whole vault walk.
+        with open(f"{self.db_path}.schema.lock", "w") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            if db.execute("PRAGMA user_version").fetchone()[0] == SCHEMA_VERSION:
+                return
+            tables = db.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'table'"
+            ).fetchall()
+            for (table,) in tables:
+                db.execute(f"DROP TABLE {table}")
+            db.executescript(SCHEMA)
+            db.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+    def __meta(self, db: sqlite3.Connection, key: str) -> int:
+        row = db.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else 0
+
+    @contextmanager
+    def __snapshot(self):
+        """
+        Reads from one consistent version of the index and yields it with that version.
+        """
+        db = self.__connect()
+        db.execute("BEGIN")
+        try:
+            version = self.__meta(db, "version")
+            with self._lock:
+                if version > self.version:
+                    self.version = version
+                    self.manifests = {}
+            yield db, version
+        finally:
+            db.execute("COMMIT")
+
+    @contextmanager
+    def __publish(self):
+        db = self.__connect()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            yield db
+            db.execute(
+                "INSERT INTO meta VALUES ('version', 1)"
+                " ON CONFLICT (key) DO UPDATE SET value = value + 1"
+            )
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+        db.execute("COMMIT")
+
+    def __clear(self, over_budget: bool = False) -> None:
+        with self.__publish() as db:
+            for table in ("notes", "tasks", "terms", "grams", "dirs"):
+                db.execute(f"DELETE FROM {table}")
+            db.execute("INSERT OR REPLACE INTO meta VALUES ('built', 0)")
+            db.execute(
+                "INSERT OR REPLACE INTO meta VALUES ('over_budget', ?)", (over_budget,)
+            )
+
+    def __write(
+        self,
+        db: sqlite3.Connection,
+        file_path: str,
+        key: tuple | None = None,
+        entry: NoteEntry | None = None,
+    ) -> None:
+        """
+        Stores or (without `entry`) removes a note, and invalidates the stored hashes
+        of its ancestor directories only.
+        """
+        for table in ("tasks", "terms", "grams"):
+            db.execute(f"DELETE FROM {table} WHERE path = ?", (file_path,))
+        ancestors = _ancestors(file_path)
+        db.execute(
+            "UPDATE dirs SET hash = NULL WHERE path IN (SELECT value FROM json_each(?))",
+            (json.dumps(ancestors),),
+        )
+        if entry is None:
+            db.execute("DELETE FROM notes WHERE path = ?", (file_path,))
+            return
+
+        known = db.execute("SELECT 1 FROM notes WHERE path = ?", (file_path,))
+        if (
+            self.max_notes
+            and known.fetchone() is None
+            and db.execute("SELECT COUNT(*) FROM notes").fetchone()[0] >= self.max_notes
+        ):
+            raise budget_error(self.max_notes)
+
+        db.execute(
+            "INSERT OR REPLACE INTO notes VALUES (?, ?, ?, ?, ?, ?)",
+            (file_path, ancestors[0], *key, entry.hash),
+        )
+        db.executemany(
+            "INSERT OR IGNORE INTO dirs VALUES (?, ?, NULL)",
+            [(path, _parent(path) if path else None) for path in ancestors],
+        )
+        db.executemany(
+            "INSERT INTO tasks VALUES (?, ?, ?, ?, ?, ?)",
+            [
+                (
+                    t.path,
+                    t.line,
+                    t.status,
+                    t.text,
+                    json.dumps(t.dates),
+                    json.dumps(t.tags),
+                )
+                for t in entry.tasks
+            ],
+        )
+        terms = note_terms(file_path, entry.aliases)
+        db.executemany(
+            "INSERT OR IGNORE INTO terms VALUES (?, ?)",
+            [(file_path, term) for term in terms],
+        )
+        db.executemany(
+            "INSERT OR IGNORE INTO grams VALUES (?, ?)",
+            {(gram, file_path) for term in terms for gram in trigrams(term)},
+        )
+
+    def __read_note(self, file_path: str) -> tuple[tuple, NoteEntry]:
+        full_path = Path(self.base_folder) / file_path
+        key = stat_key(full_path.stat())
+        with open(full_path, "rb") as f:
+            data = f.read()
+        return key, index_note(file_path, data, split_lines(data.decode("utf-8")), key)
+
+    def __stored_key(self, file_path: str) -> tuple | None:
+        return (
+            self.__connect()
+            .execute(
+                "SELECT ino, mtime_ns, size FROM notes WHERE path = ?", (file_path,)
+            )
+            .fetchone()
+        )
+
+    @property
+    def built(self) -> bool:
+        return bool(self.__meta(self.__connect(), "built"))
+
+    @property
+    def over_budget(self) -> bool:
+        return bool(self.__meta(self.__connect(), "over_budget"))
+
+    def __len__(self) -> int:
+        return self.__connect().execute("SELECT COUNT(*) FROM notes").fetchone()[0]
+
+    @contextmanager
+    def __build_lock(self):
+        """
+        Held while the vault is walked, so two workers never build the same index at
+        the same time.
+        """
+        with open(self.lock_path, "w") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            yield
+
+    def refresh(self) -> None:
+        """
+        Publishes the changes in batches of `BATCH_SIZE` notes, under the build lock.
+        """
+        with self.__build_lock():
+            self.__refresh()
+
+    def __refresh(self) -> None:
+        found = walk_notes(self.base_folder)
+        if self.max_notes and len(found) > self.max_notes:
+            self.__clear(over_budget=True)
+            raise budget_error(self.max_notes)
+
+        known = {
+            row[0]: tuple(row[1:])
+            for row in self.__connect().execute(
+                "SELECT path, ino, mtime_ns, size FROM notes"
+            )
+        }
+        changed: list[tuple[str, tuple, NoteEntry]] = []
+
+        try:
+            for file_path, key in found.items():
+                if known.get(file_path) == key:
+                    continue
+                try:
+                    changed.append((file_path, *self.__read_note(file_path)))
+                except (FileNotFoundError, UnicodeDecodeError) as e:
+                    logger.warning("Could not index '{}': {}", file_path, e)
+
+                if len(changed) >= BATCH_SIZE:
+                    with self.__publish() as db:
+                        for file_path, key, entry in changed:
+                            self.__write(db, file_path, key, entry)
+                    changed.clear()
+
+            with self.__publish() as db:
+                for file_path in known.keys() - found.keys():
+                    self.__write(db, file_path)
+                for file_path, key, entry in changed:
+                    self.__write(db, file_path, key, entry)
+                db.execute("INSERT OR REPLACE INTO meta VALUES ('built', 1)")
+                db.execute("INSERT OR REPLACE INTO meta VALUES ('over_budget', 0)")
+        except CustomError:
+            self.__clear(over_budget=True)
+            raise
+
+    def ensure_built(self) -> None:
+        """
+        Builds the index unless another worker already has. Workers that start at the
+        same time wait for the first one instead of each walking the vault.
+        """
+        if self.over_budget:
+            raise budget_error(self.max_notes)
+        if self.built:
+            return
+        with self.__build_lock():
+            if self.over_budget:
+                raise budget_error(self.max_notes)
+            if not self.built:
+                self.__refresh()
+
+    def update(self, file_path: str) -> None:
+        file_path = Path(file_path).as_posix()
+        if not self.built or not is_indexable(file_path):
+            return
+
+        try:
+            if not (Path(self.base_folder) / file_path).is_file():
+                if self.__stored_key(file_path) is not None:
+                    with self.__publish() as db:
+                        self.__write(db, file_path)
+                return
+            key, entry = self.__read_note(file_path)
+            with self.__publish() as db:
+                self.__write(db, file_path, key, entry)
+        except CustomError as ce:
+            self.__clear(over_budget=True)
+            logger.warning("Dropped index of '{}': {}", self.base_folder, ce.message)
+
+    def observe(
+        self, file_path: str, data: bytes, lines: list[str], stat: os.stat_result
+    ) -> None:
+        file_path = Path(file_path).as_posix()
+        if not self.built or not is_indexable(file_path):
+            return
+
+        key = stat_key(stat)
+        if self.__stored_key(file_path) == key:
+            return
+        try:
+            with self.__publish() as db:
+                self.__write(
+                    db, file_path, key, index_note(file_path, data, lines, key)
+                )
+        except CustomError as ce:
+            self.__clear(over_budget=True)
+            logger.warning("Dropped index of '{}': {}", self.base_folder, ce.message)
+
+    def __dir_hash(
+        self, db: sqlite3.Connection, dir_path: str, computed: dict[str, str | None]
+    ) -> str | None:
+        """
+        Returns the Merkle hash of a directory, or None once no note is left below it.
+        Stored hashes are reused, so only the directories a change invalidated are
+        recomputed. Their new hashes are collected in `computed`.
+        """
+        if dir_path in computed:
+            return computed[dir_path]
+        row = db.execute("SELECT hash FROM dirs WHERE path = ?", (dir_path,)).fetchone()
+        if row is None:
+            return None
+        if row[0] is not None:
+            return row[0]
+
+        children = [
+            (Path(path).name, "f", note_hash)
+            for path, note_hash in db.execute(
+                "SELECT path, hash FROM notes WHERE parent = ?", (dir_path,)
+            ).fetchall()
+        ]
+        for (child,) in db.execute(
+            "SELECT path FROM dirs WHERE parent = ?", (dir_path,)
+        ).fetchall():
+            child_hash = self.__dir_hash(db, child, computed)
+            if child_hash is not None:
+                children.append((Path(child).name, "d", child_hash))
+
+        computed[dir_path] = (
+            merkle_hash([(kind, name, h) for name, kind, h in sorted(children)])
+            if children
+            else None
+        )
+        return computed[dir_path]
+
+    def __store_hashes(self, version: int, computed: dict[str, str | None]) -> None:
+        """
+        Stores the directory hashes computed for `version`, unless a newer version has
+        been published since. This does not change the index, so it is not published.
+        """
+        db = self.__connect()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            if self.__meta(db, "version") == version:
+                db.executemany(
+                    "UPDATE dirs SET hash = ? WHERE path = ?",
+                    [(h, path) for path, h in computed.items() if h is not None],
+                )
+                db.executemany(
+                    "DELETE FROM dirs WHERE path = ?",
+                    [(path,) for path, h in computed.items() if h is None],
+                )
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+        db.execute("COMMIT")
+
+    def manifest(self, dir_path: str = "") -> dict:
+        """
+        Directory hashes are stored in the index, so after a change only the ancestors
+        of the changed notes are rehashed. Manifests are also cached until the index
+        version changes.
+        """
+        self.ensure_built()
+
+        dir_path = Path(dir_path).as_posix().strip("/")
+        dir_path = "" if dir_path == "." else dir_path
+        computed: dict[str, str | None] = {}
+        with self.__snapshot() as (db, version):
+            with self._lock:
+                cached = self.manifests.get(dir_path)
+            if cached is not None:
+                return cached
+
+            dir_hash = self.__dir_hash(db, dir_path, computed)
+            dirs = {}
+            for (child,) in db.execute(
+                "SELECT path FROM dirs WHERE parent = ?", (dir_path,)
+            ).fetchall():
+                child_hash = self.__dir_hash(db, child, computed)
+                if child_hash is not None:
+                    dirs[child] = child_hash
+            files = db.execute(
+                "SELECT path, hash FROM notes WHERE parent = ?", (dir_path,)
+            ).fetchall()
+            manifest = {
+                "path": dir_path,
+                "hash": dir_hash or merkle_hash([]),
+                "dirs": dict(sorted(dirs.items())),
+                "files": dict(sorted(files)),
+            }
+
+        if computed:
+            self.__store_hashes(version, computed)
+        with self._lock:
+            if self.version == version:
+                self.manifests[dir_path] = manifest
+        return manifest
+
+    def search(self, query: str, limit: int = 10) -> list[dict]:
+        self.ensure_built()
+
+        query = query.strip().lower()
+        if not query:
+            return []
+
+        query_grams = trigrams(query)
+        with self.__snapshot() as (db, _):
+            candidates = db.execute(
+                "SELECT path FROM grams"
+                " WHERE gram IN (SELECT value FROM json_each(?))"
+                " GROUP BY path ORDER BY COUNT(*) DESC LIMIT ?",
+                (json.dumps(list(query_grams)), max(limit * 5, 50)),
+            ).fetchall()
+            if candidates:
+                rows = db.execute(
+                    "SELECT path, term FROM terms"
+                    " WHERE path IN (SELECT value FROM json_each(?))",
+                    (json.dumps([path for path, in candidates]),),
+                ).fetchall()
+            else:
+                # Nothing shares a trigram (e.g. a short infix), fall back to a scan.
+                rows = db.execute("SELECT path, term FROM terms").fetchall()
+
+        terms: dict[str, list[tuple[str, frozenset[str]]]] = {}
+        for file_path, term in rows:
+            terms.setdefault(file_path, []).append((term, trigrams(term)))
+        if not candidates:
+            terms = {
+                file_path: grams
+                for file_path, grams in terms.items()
+                if any(query in term.lower() for term, _ in grams)
+            }
+
+        results = []
+        for file_path, grams in terms.items():
+            score, term = score_terms(query, query_grams, grams)
+            if score > 0:
+                results.append((score, file_path, term))
+
+        return rank(results, limit)
+
+    def query_tasks(
+        self,
+        status: str = "all",
+        path: str = "",
+        tag: str | None = None,
+        due_before: str | None = None,
+        offset: int = 0,
+        limit: int = 100,
+    ) -> tuple[int, list[dict]]:
+        self.ensure_built()
+
+        prefix = path.strip("/")
+        sql = "SELECT path, line, status, text, dates, tags FROM tasks"
+        params: tuple = ()
+        if prefix:
+            sql += " WHERE (path = ? OR (path > ? AND path < ?))"
+            params = (prefix, f"{prefix}/", f"{prefix}0")
+        sql += " ORDER BY path, line"
+
+        with self.__snapshot() as (db, _):
+            matches = [
+                task
+                for task in (
+                    Task(
+                        p, line, task_status, text, json.loads(dates), json.loads(tags)
+                    )
+                    for p, line, task_status, text, dates, tags in db.execute(
+                        sql, params
+                    )
+                )
+                if task_matches(task, status, tag, due_before)
+            ]
+
+        return len(matches), [asdict(t) for t in matches[offset : offset + limit]]
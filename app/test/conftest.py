@@ -4,10 +4,17 @@ from tempfile import TemporaryDirectory
 import pytest
 from fastapi.testclient import TestClient
 
+from app import main
 from app.file_handler import FileHandler, get_file_handler
 from app.main import app
 
 
+@pytest.fixture(autouse=True)
+def keep_default_logging(monkeypatch):
+    # Keeps loguru's default handler, so log output is captured instead of printed.
+    monkeypatch.setattr(main, "configure_logging", lambda: None)
+
+
 @pytest.fixture()
 def temp_dir():
     with TemporaryDirectory() as tmp_path:
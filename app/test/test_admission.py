@@ -0,0 +1,94 @@
+import asyncio
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app import env
+from app.admission import AdmissionController, OperationClass
+from app.exception import CustomError
+
+
+def make_controller(**kwargs) -> AdmissionController:
+    return AdmissionController(
+        max_concurrency=kwargs.get("max_concurrency", 1),
+        queue_timeout=kwargs.get("queue_timeout", 1.0),
+        classes={
+            "interactive": OperationClass(priority=0, limit=1, max_queue=4),
+            "listing": OperationClass(priority=1, limit=1, max_queue=1),
+        },
+    )
+
+
+@pytest.mark.asyncio
+async def test_interactive_requests_overtake_listings():
+    controller = make_controller()
+    order = []
+
+    async def run(name: str):
+        async with controller.slot(name):
+            order.append(name)
+
+    await controller.acquire("listing")
+    listing = asyncio.create_task(run("listing"))
+    await asyncio.sleep(0)
+    interactive = asyncio.create_task(run("interactive"))
+    await asyncio.sleep(0)
+
+    controller.release("listing")
+    await asyncio.gather(listing, interactive)
+
+    assert order == ["interactive", "listing"]
+    assert controller.stats()["active"] == 0
+
+
+@pytest.mark.asyncio
+async def test_full_queue_is_rejected():
+    controller = make_controller()
+
+    await controller.acquire("listing")
+    queued = asyncio.create_task(controller.acquire("listing"))
+    await asyncio.sleep(0)
+
+    with pytest.raises(CustomError) as exc_info:
+        await controller.acquire("listing")
+
+    assert exc_info.value.status_code == 429
+    assert "Retry-After" in exc_info.value.headers
+    assert controller.stats()["classes"]["listing"]["rejected"] == 1
+
+    controller.release("listing")
+    await queued
+    controller.release("listing")
+
+
+@pytest.mark.asyncio
+async def test_queue_timeout():
+    controller = make_controller(queue_timeout=0.01)
+
+    await controller.acquire("interactive")
+
+    with pytest.raises(CustomError) as exc_info:
+        await controller.acquire("interactive")
+
+    assert exc_info.value.status_code == 503
+    assert exc_info.value.headers == {"Retry-After": "1"}
+    assert controller.stats()["queued"] == 0
+
+    controller.release("interactive")
+
+
+def test_admission_stats(client: TestClient):
+    response = client.get("/admission")
+
+    assert response.status_code == 200
+    resp = response.json()
+    assert set(resp["classes"]) == {"interactive", "listing", "bulk"}
+    assert resp["classes"]["interactive"]["priority"] == 0
+
+
+def test_limits_are_split_between_workers(monkeypatch):
+    monkeypatch.setattr(env, "WORKERS", 4)
+
+    assert env.per_worker(16) == 4
+    assert env.per_worker(2) == 1
+    assert env.per_worker(0) == 0
@@ -0,0 +1,71 @@
+import json
+import logging
+
+import pytest
+from fastapi.testclient import TestClient
+from loguru import logger
+
+import app.log as log
+from app import main
+from app.log import is_access_record, is_app_record, silence_uvicorn_access_log
+
+
+@pytest.fixture
+def access_lines():
+    lines = []
+    handler_id = logger.add(
+        lines.append, format="{extra[access]}", filter=is_access_record
+    )
+    yield lines
+    logger.remove(handler_id)
+
+
+def test_access_log(client: TestClient, access_lines):
+    response = client.get("/", params={"q": "1"})
+
+    assert response.status_code == 200
+    assert len(access_lines) == 1
+    access = json.loads(access_lines[0])
+    assert access["method"] == "GET"
+    assert access["path"] == "/"
+    assert access["query"] == "q=1"
+    assert access["status"] == 200
+    assert access["bytes"] == len(response.content)
+    assert access["duration_ms"] >= 0
+
+
+def test_access_log_sampling(client: TestClient, access_lines, monkeypatch):
+    monkeypatch.setattr(log, "ACCESS_LOG_SAMPLE_RATE", 0.0)
+
+    client.get("/")
+    client.get("/v1/files/read", params={"path": "missing.md"})
+
+    assert [json.loads(line)["status"] for line in access_lines] == [404]
+
+
+def test_logging_configured_on_startup(monkeypatch):
+    calls = []
+    monkeypatch.setattr(main, "configure_logging", lambda: calls.append(True))
+
+    assert calls == []
+    with TestClient(main.app):
+        assert calls == [True]
+
+
+def test_log_filters():
+    assert is_app_record({"name": "app.router", "extra": {}})
+    assert not is_app_record({"name": "uvicorn.error", "extra": {}})
+    assert not is_app_record({"name": "app.log", "extra": {"access": "{}"}})
+    assert is_access_record({"name": "app.log", "extra": {"access": "{}"}})
+
+
+def test_uvicorn_access_log_silenced(monkeypatch):
+    access_logger = logging.getLogger("uvicorn.access")
+    monkeypatch.setattr(access_logger, "handlers", [logging.StreamHandler()])
+    monkeypatch.setattr(access_logger, "propagate", True)
+    monkeypatch.setattr(access_logger, "disabled", False)
+
+    silence_uvicorn_access_log()
+
+    assert not access_logger.hasHandlers()
+    assert not access_logger.isEnabledFor(logging.INFO)
@@ -0,0 +1,125 @@
+import pytest
+from fastapi.testclient import TestClient
+from loguru import logger
+
+import app.profiling as profiling
+
+
+@pytest.fixture
+def log_messages():
+    messages = []
+    handler_id = logger.add(messages.append, format="{message}", level="WARNING")
+    yield messages
+    logger.remove(handler_id)
+
+
+def test_slow_request_breakdown(
+    client: TestClient, setup_temp_dir_content, log_messages, monkeypatch
+):
+    monkeypatch.setattr(profiling, "SLOW_REQUEST_MS", 0)
+    setup_temp_dir_content(["file1.md"], {"file1.md": "---\ntitle: A\n---\nText"})
+
+    client.get("/v1/files/read", params={"path": "file1.md", "content": "frontmatter"})
+
+    slow = [m for m in log_messages if m.startswith("Slow request")]
+    assert len(slow) == 1
+    for phase in [
+        "validation",
+        "file_read",
+        "frontmatter_parse",
+        "serialization",
+        "other",
+    ]:
+        assert f"'{phase}'" in slow[0]
+
+
+def test_fast_request_not_logged(client: TestClient, log_messages, monkeypatch):
+    monkeypatch.setattr(profiling, "SLOW_REQUEST_MS", 60_000)
+
+    client.get("/")
+
+    assert not [m for m in log_messages if m.startswith("Slow request")]
+
+
+def test_profile_request(client: TestClient, setup_temp_dir_content, monkeypatch):
+    monkeypatch.setattr(profiling, "PROFILING_TOKEN", "secret")
+    setup_temp_dir_content(["file1.md"], {"file1.md": "Text"})
+
+    response = client.get(
+        "/v1/files/read", params={"path": "file1.md"}, headers={"X-Profile": "secret"}
+    )
+
+    assert response.status_code == 200
+    profile_id = response.headers["x-profile-id"]
+
+    response = client.get(
+        f"/debug/profiles/{profile_id}", headers={"X-Profile": "secret"}
+    )
+
+    assert response.status_code == 200
+    resp = response.json()
+    assert resp["path"] == "/v1/files/read"
+    assert resp["status_code"] == 200
+    assert "file_read" in resp["phases"]
+    assert isinstance(resp["stacks"], list)
+
+
+def test_profile_from_another_worker(
+    client: TestClient, setup_temp_dir_content, temp_dir, monkeypatch
+):
+    monkeypatch.setattr(profiling, "PROFILING_TOKEN", "secret")
+    monkeypatch.setattr(profiling, "SHARED_INDEX_DIR", temp_dir)
+    monkeypatch.setattr(profiling, "MAX_STORED_PROFILES", 1)
+    setup_temp_dir_content(["file1.md"], {"file1.md": "Text"})
+
+    first, second = (
+        client.get(
+            "/v1/files/read",
+            params={"path": "file1.md"},
+            headers={"X-Profile": "secret"},
+        ).headers["x-profile-id"]
+        for _ in range(2)
+    )
+    monkeypatch.setattr(profiling, "profiles", profiling.OrderedDict())
+
+    response = client.get(f"/debug/profiles/{second}", headers={"X-Profile": "secret"})
+    assert response.status_code == 200
+    assert response.json()["path"] == "/v1/files/read"
+    for profile_id in (first, "..%2Fsecret"):
+        response = client.get(
+            f"/debug/profiles/{profile_id}", headers={"X-Profile": "secret"}
+        )
+        assert response.status_code == 404
+
+
+def test_sampler_watches_threads_inside_spans(monkeypatch):
+    sampler = profiling.Sampler()
+    monkeypatch.setattr(profiling, "_spans", profiling.ContextVar("spans", default=[]))
+    monkeypatch.setattr(
+        profiling, "_sampler", profiling.ContextVar("sampler", default=sampler)
+    )
+    thread_id = profiling.threading.get_ident()
+
+    assert thread_id not in sampler.threads
+    with profiling.span("outer"):
+        with profiling.span("inner"):
+            assert sampler.threads[thread_id] == 2
+        assert thread_id in sampler.threads
+    assert thread_id not in sampler.threads
+
+
+def test_profile_requires_token(client: TestClient, monkeypatch):
+    monkeypatch.setattr(profiling, "PROFILING_TOKEN", "secret")
+
+    response = client.get("/", headers={"X-Profile": "wrong"})
+    assert "x-profile-id" not in response.headers
+
+    response = client.get("/debug/profiles/anything", headers={"X-Profile": "wrong"})
+    assert response.status_code == 403
+    assert response.json().get("message") == "Profiling is not authorized."
+
+
+def test_profiling_disabled_without_token(client: TestClient):
+    response = client.get("/", headers={"X-Profile": ""})
+
+    assert "x-profile-id" not in response.headers
@@ -0,0 +1,252 @@
+import asyncio
+import fcntl
+import os
+import sqlite3
+import subprocess
+import sys
+import threading
+import time
+from collections import Counter
+from tempfile import TemporaryDirectory
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app import shared_index as shared_index_module
+from app import vault_index as vault_index_module
+from app.exception import CustomError
+from app.file_handler import FileHandler, get_file_handler
+from app.main import app
+from app.shared_index import SharedVaultIndex, claim_ownership
+from app.vault_index import VaultIndex, refresh_indexes_periodically
+
+FILES = [
+    "Projects/Roadmap.md",
+    "Projects/Sub/Plan.md",
+    "Daily/2025-01-01.md",
+    "People/Robert Smith.md",
+    ".obsidian/Roadmap.md",
+]
+CONTENT = {
+    "Projects/Roadmap.md": "- [ ] Ship #work 📅 2025-02-01\n- [x] Draft #work",
+    "Daily/2025-01-01.md": "- [ ] Call Bob due:: 2025-01-02",
+    "People/Robert Smith.md": "---\naliases:\n  - Bob\n---\nNotes",
+}
+
+
+@pytest.fixture
+def index_dir():
+    with TemporaryDirectory() as tmp_path:
+        yield tmp_path
+
+
+def test_matches_in_memory_index(setup_temp_dir_content, temp_dir, index_dir):
+    setup_temp_dir_content(FILES, CONTENT)
+    memory = VaultIndex(temp_dir)
+    shared = SharedVaultIndex(temp_dir, index_dir)
+    memory.ensure_built()
+    shared.ensure_built()
+
+    assert len(shared) == len(memory) == 4
+    for dir_path in ("", "Projects", "Projects/Sub", "missing"):
+        assert shared.manifest(dir_path) == memory.manifest(dir_path)
+    for query in ("roadmap", "bob", "raodmap", "ert", "zzz"):
+        assert shared.search(query) == memory.search(query)
+    for filters in (
+        {},
+        {"status": "open"},
+        {"status": "done", "path": "Projects"},
+        {"tag": "#work"},
+        {"due_before": "2025-01-15"},
+        {"offset": 1, "limit": 1},
+    ):
+        assert shared.query_tasks(**filters) == memory.query_tasks(**filters)
+
+
+def test_concurrent_builds_read_each_note_once(
+    setup_temp_dir_content, temp_dir, index_dir, monkeypatch
+):
+    files = [f"Notes/{i}.md" for i in range(50)]
+    setup_temp_dir_content(files)
+    reads = Counter()
+    index_note = shared_index_module.index_note
+
+    def slow_index_note(file_path, *args):
+        reads[file_path] += 1
+        time.sleep(0.001)
+        return index_note(file_path, *args)
+
+    monkeypatch.setattr(shared_index_module, "index_note", slow_index_note)
+    owner = SharedVaultIndex(temp_dir, index_dir)
+    worker = SharedVaultIndex(temp_dir, index_dir)
+    builds = [
+        threading.Thread(target=owner.refresh),
+        threading.Thread(target=worker.ensure_built),
+    ]
+    for build in builds:
+        build.start()
+    for build in builds:
+        build.join()
+
+    assert worker.built is True
+    assert len(worker) == 50
+    assert reads == Counter(files)
+
+
+def test_open_does_not_wait_for_a_build(temp_dir, index_dir):
+    building = SharedVaultIndex(temp_dir, index_dir)
+
+    with open(building.lock_path, "w") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        opened = threading.Thread(target=SharedVaultIndex, args=(temp_dir, index_dir))
+        opened.start()
+        opened.join(timeout=5)
+        assert not opened.is_alive()
+
+
+def test_workers_see_published_changes(setup_temp_dir_content, temp_dir, index_dir):
+    setup_temp_dir_content(FILES, CONTENT)
+    owner = SharedVaultIndex(temp_dir, index_dir)
+    worker = SharedVaultIndex(temp_dir, index_dir)
+    owner.refresh()
+
+    before = worker.manifest("Projects")
+    assert worker.built is True
+
+    with open(os.path.join(temp_dir, "Projects/Sub/Plan.md"), "w") as f:
+        f.write("- [ ] New task")
+    os.remove(os.path.join(temp_dir, "Daily/2025-01-01.md"))
+    owner.refresh()
+
+    after = worker.manifest("Projects")
+    assert after["hash"] != before["hash"]
+    assert after["dirs"]["Projects/Sub"] != before["dirs"]["Projects/Sub"]
+    assert after == VaultIndex(temp_dir).manifest("Projects")
+    assert "Daily/2025-01-01.md" not in [r["path"] for r in worker.search("2025")]
+    assert [t["text"] for t in worker.query_tasks(path="Projects/Sub")[1]] == [
+        "New task"
+    ]
+
+
+def test_update_from_any_worker(setup_temp_dir_content, temp_dir, index_dir):
+    setup_temp_dir_content(FILES, CONTENT)
+    owner = SharedVaultIndex(temp_dir, index_dir)
+    worker = SharedVaultIndex(temp_dir, index_dir)
+    owner.refresh()
+    owner.manifest()
+
+    with open(os.path.join(temp_dir, "Quarterly plan.md"), "w") as f:
+        f.write("Plan")
+    worker.update("Quarterly plan.md")
+
+    assert owner.search("quarterly")[0]["path"] == "Quarterly plan.md"
+    assert "Quarterly plan.md" in owner.manifest()["files"]
+
+
+def test_manifest_rehashes_changed_ancestors(
+    setup_temp_dir_content, temp_dir, index_dir
+):
+    setup_temp_dir_content(FILES, CONTENT)
+    shared = SharedVaultIndex(temp_dir, index_dir)
+    shared.manifest()
+
+    def stale_dirs() -> set[str]:
+        with sqlite3.connect(shared.db_path) as db:
+            rows = db.execute("SELECT path FROM dirs WHERE hash IS NULL").fetchall()
+        return {path for path, in rows}
+
+    assert stale_dirs() == set()
+
+    with open(os.path.join(temp_dir, "Projects/Sub/Plan.md"), "w") as f:
+        f.write("- [ ] New task")
+    shared.update("Projects/Sub/Plan.md")
+    assert stale_dirs() == {"", "Projects", "Projects/Sub"}
+
+    os.remove(os.path.join(temp_dir, "Daily/2025-01-01.md"))
+    shared.update("Daily/2025-01-01.md")
+    assert stale_dirs() == {"", "Projects", "Projects/Sub", "Daily"}
+
+    memory = VaultIndex(temp_dir)
+    assert shared.manifest() == memory.manifest()
+    assert stale_dirs() == set()
+    for dir_path in ("Projects", "Projects/Sub", "Daily"):
+        assert shared.manifest(dir_path) == memory.manifest(dir_path)
+
+
+def test_index_budget(setup_temp_dir_content, temp_dir, index_dir):
+    setup_temp_dir_content(FILES, CONTENT)
+    shared = SharedVaultIndex(temp_dir, index_dir, max_notes=3)
+
+    with pytest.raises(CustomError) as exc_info:
+        shared.ensure_built()
+
+    assert exc_info.value.status_code == 507
+    assert shared.built is False
+    assert len(shared) == 0
+
+
+@pytest.mark.asyncio
+async def test_owner_refreshes_every_vault(
+    setup_temp_dir_content, temp_dir, index_dir, monkeypatch
+):
+    monkeypatch.setattr(vault_index_module, "SHARED_INDEX_DIR", index_dir)
+    setup_temp_dir_content(FILES, CONTENT)
+    worker = SharedVaultIndex(temp_dir, index_dir)
+    worker.ensure_built()
+    assert temp_dir not in vault_index_module._indexes
+
+    setup_temp_dir_content(["Quarterly plan.md"], {"Quarterly plan.md": "Plan"})
+    refresher = asyncio.create_task(
+        refresh_indexes_periodically(0, vaults={temp_dir: 0})
+    )
+    try:
+        for _ in range(200):
+            await asyncio.sleep(0.01)
+            if worker.search("quarterly"):
+                break
+    finally:
+        refresher.cancel()
+
+    assert worker.search("quarterly")[0]["path"] == "Quarterly plan.md"
+
+
+def test_single_owner(index_dir):
+    script = (
+        "import sys; from app.shared_index import claim_ownership; "
+        "print(claim_ownership(sys.argv[1]))"
+    )
+    root = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))
+
+    assert claim_ownership(index_dir) is True
+    assert claim_ownership(index_dir) is True
+    other = subprocess.run(
+        [sys.executable, "-c", script, index_dir],
+        cwd=root,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    assert other.stdout.strip() == "False"
+    assert claim_ownership("") is True
+
+
+def test_endpoints_use_shared_index(
+    setup_temp_dir_content, temp_dir, index_dir, monkeypatch
+):
+    monkeypatch.setattr(vault_index_module, "SHARED_INDEX_DIR", index_dir)
+    setup_temp_dir_content(FILES, CONTENT)
+
+    fh = FileHandler(temp_dir)
+    app.dependency_overrides[get_file_handler] = lambda: fh
+    try:
+        with TestClient(app) as client:
+            tasks = client.get("/v1/files/tasks", params={"status": "open"}).json()
+            manifest = client.get("/v1/files/manifest").json()
+    finally:
+        app.dependency_overrides.clear()
+        vault_index_module.drop_vault_index(temp_dir)
+
+    assert isinstance(fh.index, SharedVaultIndex)
+    assert fh.index.built is True
+    assert tasks["total"] == 2
+    assert manifest == VaultIndex(temp_dir).manifest()
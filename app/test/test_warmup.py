@@ -0,0 +1,128 @@
+import os
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app import main
+from app import warmup as warmup_module
+from app.main import warmups
+from app.warmup import Warmup, load_hot_notes, save_hot_notes
+
+
+@pytest.mark.asyncio
+async def test_warmup_indexes_and_preloads(setup_temp_dir_content, temp_dir):
+    files = ["file1.md", "dir1/file2.md"]
+    setup_temp_dir_content(files, {"file1.md": "---\ntitle: A\n---\n- [ ] Task"})
+
+    vault_warmup = Warmup(temp_dir, hot_notes=["file1.md", "missing.md", "file1.md"])
+    await vault_warmup.run()
+
+    state = vault_warmup.state.to_response()
+    assert state["ready"] is True
+    assert state["phase"] == "ready"
+    assert state["notes_indexed"] == 2
+    assert state["hot_notes_total"] == 2
+    assert state["hot_notes_loaded"] == 2
+
+
+@pytest.mark.asyncio
+async def test_warmup_over_budget(setup_temp_dir_content, temp_dir):
+    setup_temp_dir_content(["file1.md", "file2.md"])
+
+    vault_warmup = Warmup(temp_dir, hot_notes=[], max_notes=1)
+    await vault_warmup.run()
+
+    assert vault_warmup.state.phase == "over_budget"
+    assert vault_warmup.state.ready is True
+    assert vault_warmup.state.finished is True
+
+
+@pytest.mark.asyncio
+async def test_warmup_failure(temp_dir):
+    vault_warmup = Warmup(os.path.join(temp_dir, "missing"), hot_notes=[])
+    await vault_warmup.run()
+
+    assert vault_warmup.state.phase == "failed"
+    assert vault_warmup.state.ready is False
+
+
+def test_hot_notes_round_trip(
+    client: TestClient, setup_temp_dir_content, temp_dir, monkeypatch
+):
+    monkeypatch.setattr(warmup_module, "note_reads", warmup_module.Counter())
+    setup_temp_dir_content(["file1.md", "file2.md"])
+
+    client.get("/v1/files/read", params={"path": "file2.md"})
+    client.get("/v1/files/read", params={"path": "file2.md"})
+    client.get("/v1/files/read", params={"path": "file1.md"})
+    client.get("/v1/files/read", params={"path": "missing.md"})
+
+    hot_notes_file = os.path.join(temp_dir, ".hot_notes")
+    save_hot_notes(hot_notes_file, limit=10)
+
+    assert load_hot_notes(hot_notes_file) == ["file2.md", "file1.md"]
+
+
+def test_hot_notes_merge_workers(temp_dir, monkeypatch):
+    hot_notes_file = os.path.join(temp_dir, ".hot_notes")
+    with open(hot_notes_file, "w") as f:
+        f.write("old.md\nfile3.md")
+    os.utime(hot_notes_file, (0, 0))
+    assert load_hot_notes(hot_notes_file) == ["old.md", "file3.md"]
+
+    monkeypatch.setattr(
+        warmup_module, "note_reads", warmup_module.Counter({"file1.md": 2})
+    )
+    save_hot_notes(hot_notes_file, limit=10)
+    monkeypatch.setattr(
+        warmup_module,
+        "note_reads",
+        warmup_module.Counter({"file2.md": 3, "file1.md": 2}),
+    )
+    save_hot_notes(hot_notes_file, limit=10)
+
+    assert load_hot_notes(hot_notes_file) == ["file1.md", "file2.md"]
+
+
+def test_healthz(client: TestClient):
+    response = client.get("/healthz")
+
+    assert response.status_code == 200
+    assert response.json() == {"status": "ok"}
+
+
+def test_readyz(client: TestClient):
+    deadline = time.monotonic() + 5
+    while not warmups["default"].state.ready and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+    response = client.get("/readyz")
+
+    assert response.status_code == 200
+    assert response.json()["ready"] is True
+    assert response.json()["vaults"]["default"]["phase"] == "ready"
+
+
+def test_readyz_waits_for_every_vault(client: TestClient, temp_dir, monkeypatch):
+    ready = Warmup(temp_dir, hot_notes=[])
+    ready.state.phase = "ready"
+    failed = Warmup(temp_dir, hot_notes=[])
+    failed.state.phase = "failed"
+    pending = Warmup(temp_dir, hot_notes=[])
+
+    monkeypatch.setattr(main, "warmups", {"default": ready, "work": pending})
+    response = client.get("/readyz")
+    assert response.status_code == 503
+    assert response.json()["vaults"]["work"]["phase"] == "pending"
+
+    monkeypatch.setattr(main, "warmups", {"default": ready, "work": failed})
+    assert client.get("/readyz").status_code == 200
+
+    monkeypatch.setattr(main, "warmups", {"default": failed, "work": ready})
+    assert client.get("/readyz").status_code == 503
+
+    over_budget = Warmup(temp_dir, hot_notes=[])
+    over_budget.state.phase = "over_budget"
+    monkeypatch.setattr(main, "warmups", {"default": over_budget, "work": ready})
+    assert client.get("/readyz").status_code == 200
@@ -0,0 +1,125 @@
+from fastapi.responses import FileResponse
+from fastapi.testclient import TestClient
+
+from app import router
+from app.admission import admission
+
+""" Test cases for /v1/files/attachment GET endpoint:
+    - serve a file with its content type
+    - range requests
+    - conditional requests with ETag and Last-Modified
+    - the admission slot is released before the file is sent
+    - error handling:
+        absolute path
+        path outside the base folder
+        hidden file
+        non-existent file
+"""
+
+PDF = "%PDF-1.4 0123456789"
+
+
+def test_read_attachment(client: TestClient, setup_temp_dir_content):
+    setup_temp_dir_content(["assets/doc.pdf"], {"assets/doc.pdf": PDF})
+
+    response = client.get("/v1/files/attachment", params={"path": "assets/doc.pdf"})
+
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/pdf"
+    assert response.headers["accept-ranges"] == "bytes"
+    assert "etag" in response.headers
+    assert "last-modified" in response.headers
+    assert response.text == PDF
+
+
+def test_read_attachment_range(client: TestClient, setup_temp_dir_content):
+    setup_temp_dir_content(["assets/doc.pdf"], {"assets/doc.pdf": PDF})
+
+    response = client.get(
+        "/v1/files/attachment",
+        params={"path": "assets/doc.pdf"},
+        headers={"Range": "bytes=9-12"},
+    )
+
+    assert response.status_code == 206
+    assert response.headers["content-range"] == f"bytes 9-12/{len(PDF)}"
+    assert response.text == "0123"
+
+
+def test_read_attachment_not_modified(client: TestClient, setup_temp_dir_content):
+    setup_temp_dir_content(["assets/doc.pdf"], {"assets/doc.pdf": PDF})
+    first = client.get("/v1/files/attachment", params={"path": "assets/doc.pdf"})
+
+    response = client.get(
+        "/v1/files/attachment",
+        params={"path": "assets/doc.pdf"},
+        headers={"If-None-Match": first.headers["etag"]},
+    )
+    assert response.status_code == 304
+    assert response.content == b""
+
+    response = client.get(
+        "/v1/files/attachment",
+        params={"path": "assets/doc.pdf"},
+        headers={"If-Modified-Since": first.headers["last-modified"]},
+    )
+    assert response.status_code == 304
+
+
+def test_read_attachment_absolute_path(client: TestClient):
+    response = client.get("/v1/files/attachment", params={"path": "/etc/passwd"})
+
+    assert response.status_code == 400
+    assert response.json().get("message") == "The path must be a relative path."
+
+
+def test_read_attachment_outside_base_folder(client: TestClient):
+    response = client.get(
+        "/v1/files/attachment", params={"path": "../../../../etc/passwd"}
+    )
+
+    assert response.status_code == 400
+    assert (
+        response.json().get("message") == "The path must stay within the base folder."
+    )
+
+
+def test_read_attachment_hidden_file(client: TestClient, setup_temp_dir_content):
+    setup_temp_dir_content([".obsidian/app.json"])
+
+    response = client.get("/v1/files/attachment", params={"path": ".obsidian/app.json"})
+
+    assert response.status_code == 404
+    assert (
+        response.json().get("message")
+        == "The provided file_path '.obsidian/app.json' is not a valid file within the base folder."
+    )
+
+
+def test_read_attachment_invalid_path(client: TestClient):
+    response = client.get("/v1/files/attachment", params={"path": "missing.png"})
+
+    assert response.status_code == 404
+    assert (
+        response.json().get("message")
+        == "The provided path 'missing.png' does not exist within the base folder."
+    )
+
+
+def test_read_attachment_releases_slot(
+    client: TestClient, setup_temp_dir_content, monkeypatch
+):
+    setup_temp_dir_content(["assets/doc.pdf"], {"assets/doc.pdf": PDF})
+    active_during_send = []
+
+    class RecordingFileResponse(FileResponse):
+        async def __call__(self, scope, receive, send):
+            active_during_send.append(admission.classes["interactive"].active)
+            await super().__call__(scope, receive, send)
+
+    monkeypatch.setattr(router, "FileResponse", RecordingFileResponse)
+
+    response = client.get("/v1/files/attachment", params={"path": "assets/doc.pdf"})
+
+    assert response.text == PDF
+    assert active_during_send == [0]
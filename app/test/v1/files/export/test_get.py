@@ -0,0 +1,111 @@
+import io
+import os
+import tarfile
+import time
+import zipfile
+from tempfile import TemporaryDirectory
+
+from fastapi.testclient import TestClient
+
+""" Test cases for /v1/files/export GET endpoint:
+    - tar and zip export of the vault and of a subtree
+    - hidden files and symlinks are skipped
+    - only files changed since a timestamp
+    - error handling:
+        absolute path
+        non-existent directory
+        path outside the base folder
+        unsupported format
+"""
+
+FILES = ["file1.md", "dir1/file2.md", "dir1/image.png", ".obsidian/app.json"]
+CONTENT = {"file1.md": "one", "dir1/file2.md": "two" * 1000, "dir1/image.png": "png"}
+
+
+def read_tar(data: bytes) -> dict[str, bytes]:
+    with tarfile.open(fileobj=io.BytesIO(data)) as archive:
+        return {m.name: archive.extractfile(m).read() for m in archive if m.isfile()}
+
+
+def test_export_tar(client: TestClient, setup_temp_dir_content):
+    setup_temp_dir_content(FILES, CONTENT)
+
+    response = client.get("/v1/files/export")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-tar"
+    assert response.headers["content-disposition"] == 'attachment; filename="vault.tar"'
+    assert read_tar(response.content) == {
+        name: text.encode() for name, text in CONTENT.items()
+    }
+
+
+def test_export_zip_subtree(client: TestClient, setup_temp_dir_content):
+    setup_temp_dir_content(FILES, CONTENT)
+
+    response = client.get("/v1/files/export", params={"path": "dir1", "format": "zip"})
+
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/zip"
+    with zipfile.ZipFile(io.BytesIO(response.content)) as archive:
+        assert sorted(archive.namelist()) == ["file2.md", "image.png"]
+        assert archive.read("file2.md") == CONTENT["dir1/file2.md"].encode()
+
+
+def test_export_since(client: TestClient, setup_temp_dir_content, temp_dir):
+    setup_temp_dir_content(FILES, CONTENT)
+    old = time.time() - 3600
+    os.utime(os.path.join(temp_dir, "file1.md"), (old, old))
+    os.utime(os.path.join(temp_dir, "dir1/image.png"), (old, old))
+
+    response = client.get("/v1/files/export", params={"since": int(time.time() - 60)})
+
+    assert list(read_tar(response.content)) == ["dir1/file2.md"]
+
+
+def test_export_absolute_path(client: TestClient):
+    response = client.get("/v1/files/export", params={"path": "/absolute/path"})
+
+    assert response.status_code == 400
+    assert response.json().get("message") == "The path must be a relative path."
+
+
+def test_export_invalid_path(client: TestClient):
+    response = client.get("/v1/files/export", params={"path": "nonexistent"})
+
+    assert response.status_code == 404
+    assert (
+        response.json().get("message")
+        == "The provided path 'nonexistent' does not exist within the base folder."
+    )
+
+
+def test_export_skips_symlinks(client: TestClient, setup_temp_dir_content, temp_dir):
+    setup_temp_dir_content(FILES, CONTENT)
+    with TemporaryDirectory() as outside:
+        secret = os.path.join(outside, "secret")
+        with open(secret, "w") as f:
+            f.write("secret")
+        os.symlink(secret, os.path.join(temp_dir, "link.md"))
+        os.symlink(outside, os.path.join(temp_dir, "linked_dir"))
+
+        response = client.get("/v1/files/export")
+
+        assert read_tar(response.content) == {
+            name: text.encode() for name, text in CONTENT.items()
+        }
+
+
+def test_export_outside_base(client: TestClient):
+    response = client.get("/v1/files/export", params={"path": ".."})
+
+    assert response.status_code == 400
+    assert (
+        response.json().get("message") == "The path must stay within the base folder."
+    )
+
+
+def test_export_unsupported_format(client: TestClient):
+    response = client.get("/v1/files/export", params={"format": "tar.zst"})
+
+    assert response.status_code == 422
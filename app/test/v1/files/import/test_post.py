@@ -0,0 +1,145 @@
+import io
+import os
+import tarfile
+import zipfile
+from tempfile import TemporaryDirectory
+
+from fastapi.testclient import TestClient
+
+""" Test cases for /v1/files/import POST endpoint:
+    - tar and zip import into a directory
+    - existing, hidden and escaping members are skipped
+    - error handling:
+        invalid archive
+        non-existent directory
+        paths outside the base folder, directly or through a symlink
+        hidden target directory
+"""
+
+
+def make_tar(files: dict[str, str]) -> bytes:
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode="w") as archive:
+        for name, text in files.items():
+            info = tarfile.TarInfo(name)
+            info.size = len(text.encode())
+            archive.addfile(info, io.BytesIO(text.encode()))
+    return buffer.getvalue()
+
+
+def test_import_tar(client: TestClient, setup_temp_dir_content, temp_dir):
+    setup_temp_dir_content(["dir1/existing.md"], {"dir1/existing.md": "keep"})
+    data = make_tar(
+        {
+            "new.md": "new",
+            "sub/deep.md": "deep",
+            "existing.md": "overwrite",
+            ".obsidian/app.json": "{}",
+            "../escape.md": "escape",
+        }
+    )
+
+    response = client.post(
+        "/v1/files/import", params={"path": "dir1", "format": "tar"}, content=data
+    )
+
+    assert response.status_code == 200
+    assert response.json() == {
+        "written": ["new.md", "sub/deep.md"],
+        "skipped": ["existing.md", ".obsidian/app.json", "../escape.md"],
+    }
+    with open(os.path.join(temp_dir, "dir1/sub/deep.md")) as f:
+        assert f.read() == "deep"
+    with open(os.path.join(temp_dir, "dir1/existing.md")) as f:
+        assert f.read() == "keep"
+    assert not os.path.exists(os.path.join(temp_dir, "escape.md"))
+
+
+def test_import_zip(client: TestClient, temp_dir):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as archive:
+        archive.writestr("note.md", "zip note")
+
+    response = client.post(
+        "/v1/files/import", params={"format": "zip"}, content=buffer.getvalue()
+    )
+
+    assert response.status_code == 200
+    assert response.json() == {"written": ["note.md"], "skipped": []}
+    with open(os.path.join(temp_dir, "note.md")) as f:
+        assert f.read() == "zip note"
+
+
+def test_import_export_round_trip(client: TestClient, setup_temp_dir_content):
+    setup_temp_dir_content(["a.md", "dir1/b.md", "dir2/.keep"])
+    export = client.get("/v1/files/export", params={"path": "dir1"})
+
+    response = client.post(
+        "/v1/files/import", params={"path": "dir2"}, content=export.content
+    )
+
+    assert response.json() == {"written": ["b.md"], "skipped": []}
+
+
+def test_import_invalid_archive(client: TestClient):
+    response = client.post(
+        "/v1/files/import", params={"format": "zip"}, content=b"not a zip"
+    )
+
+    assert response.status_code == 400
+    assert response.json().get("message").startswith("The archive could not be read")
+
+
+def test_import_invalid_path(client: TestClient):
+    response = client.post(
+        "/v1/files/import", params={"path": "nonexistent"}, content=make_tar({})
+    )
+
+    assert response.status_code == 404
+    assert (
+        response.json().get("message")
+        == "The provided path 'nonexistent' does not exist within the base folder."
+    )
+
+
+def test_import_outside_base(client: TestClient, temp_dir):
+    response = client.post(
+        "/v1/files/import",
+        params={"path": "../outside"},
+        content=make_tar({"evil.md": "evil"}),
+    )
+
+    assert response.status_code == 400
+    assert (
+        response.json().get("message") == "The path must stay within the base folder."
+    )
+
+
+def test_import_through_symlinked_dir(client: TestClient, temp_dir):
+    with TemporaryDirectory() as outside:
+        os.symlink(outside, os.path.join(temp_dir, "link"))
+
+        response = client.post(
+            "/v1/files/import",
+            content=make_tar({"link/evil.md": "evil", "ok.md": "ok"}),
+        )
+
+        assert response.json() == {"written": ["ok.md"], "skipped": ["link/evil.md"]}
+        assert os.listdir(outside) == []
+
+
+def test_import_into_hidden_dir(client: TestClient, temp_dir):
+    os.makedirs(os.path.join(temp_dir, ".obsidian/plugins"))
+
+    response = client.post(
+        "/v1/files/import",
+        params={"path": ".obsidian/plugins"},
+        content=make_tar({"evil/main.js": "evil"}),
+    )
+
+    assert response.status_code == 404
+    assert (
+        response.json().get("message")
+        == "The provided file_path '.obsidian/plugins' is not a valid file within the base folder."
+    )
+    assert os.listdir(os.path.join(temp_dir, ".obsidian/plugins")) == []
@@ -0,0 +1,88 @@
+import hashlib
+import os
+
+from fastapi.testclient import TestClient
+
+from app.vault_index import get_vault_index
+
+""" Test cases for /v1/files/manifest GET endpoint:
+    - file and directory hashes
+    - only the changed subtree's hashes change
+    - error handling:
+        absolute path
+        non-existent directory
+"""
+
+
+def sha256(text: str) -> str:
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+def test_get_manifest(client: TestClient, setup_temp_dir_content):
+    files = ["file1.md", "dir1/file2.md", "dir1/dir2/file3.md", "file4.txt"]
+    content = {"file1.md": "one", "dir1/file2.md": "two", "dir1/dir2/file3.md": "3"}
+    setup_temp_dir_content(files, content)
+
+    response = client.get("/v1/files/manifest")
+
+    assert response.status_code == 200
+    resp = response.json()
+    assert resp["path"] == ""
+    assert resp["files"] == {"file1.md": sha256("one")}
+    assert list(resp["dirs"]) == ["dir1"]
+
+    response = client.get("/v1/files/manifest", params={"path": "dir1"})
+
+    resp = response.json()
+    assert resp["files"] == {"dir1/file2.md": sha256("two")}
+    assert list(resp["dirs"]) == ["dir1/dir2"]
+    assert resp["hash"] == client.get("/v1/files/manifest").json()["dirs"]["dir1"]
+
+
+def test_get_manifest_incremental_change(
+    client: TestClient, setup_temp_dir_content, temp_dir
+):
+    files = ["dir1/file1.md", "dir2/file2.md"]
+    setup_temp_dir_content(files)
+
+    before = client.get("/v1/files/manifest").json()
+
+    with open(os.path.join(temp_dir, "dir2/file2.md"), "w") as f:
+        f.write("changed")
+    get_vault_index(temp_dir).update("dir2/file2.md")
+
+    after = client.get("/v1/files/manifest").json()
+
+    assert after["hash"] != before["hash"]
+    assert after["dirs"]["dir1"] == before["dirs"]["dir1"]
+    assert after["dirs"]["dir2"] != before["dirs"]["dir2"]
+
+
+def test_get_manifest_deleted_dir(client: TestClient, setup_temp_dir_content, temp_dir):
+    files = ["dir1/file1.md", "dir2/file2.md"]
+    setup_temp_dir_content(files)
+    client.get("/v1/files/manifest")
+
+    os.remove(os.path.join(temp_dir, "dir2/file2.md"))
+    get_vault_index(temp_dir).refresh()
+
+    response = client.get("/v1/files/manifest")
+
+    assert list(response.json()["dirs"]) == ["dir1"]
+
+
+def test_get_manifest_absolute_path(client: TestClient):
+    response = client.get("/v1/files/manifest", params={"path": "/absolute/path"})
+
+    assert response.status_code == 400
+    assert response.json().get("message") == "The path must be a relative path."
+
+
+def test_get_manifest_invalid_path(client: TestClient):
+    response = client.get("/v1/files/manifest", params={"path": "nonexistent"})
+
+    assert response.status_code == 404
+    assert (
+        response.json().get("message")
+        == "The provided path 'nonexistent' does not exist within the base folder."
+    )
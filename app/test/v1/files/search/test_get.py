@@ -0,0 +1,88 @@
+import os
+
+from fastapi.testclient import TestClient
+
+from app.vault_index import get_vault_index
+
+""" Test cases for /v1/files/search GET endpoint:
+    - ranking by basename, path and alias
+    - typo tolerance
+    - index updates after create, rename and delete
+"""
+
+FILES = [
+    "Projects/Roadmap.md",
+    "Projects/Road trip.md",
+    "Daily/2025-01-01.md",
+    "People/Robert Smith.md",
+    ".obsidian/Roadmap.md",
+]
+CONTENT = {"People/Robert Smith.md": "---\naliases:\n  - Bob\n---\nNotes"}
+
+
+def search(client: TestClient, q: str, **params) -> list[dict]:
+    response = client.get("/v1/files/search", params={"q": q, **params})
+    assert response.status_code == 200
+    return response.json()["results"]
+
+
+def test_search_by_basename(client: TestClient, setup_temp_dir_content):
+    setup_temp_dir_content(FILES, CONTENT)
+
+    results = search(client, "roadmap")
+
+    assert results[0] == {
+        "path": "Projects/Roadmap.md",
+        "score": 2.0,
+        "match": "Roadmap",
+    }
+    assert "Projects/Road trip.md" in [r["path"] for r in results]
+    assert ".obsidian/Roadmap.md" not in [r["path"] for r in results]
+
+
+def test_search_by_alias(client: TestClient, setup_temp_dir_content):
+    setup_temp_dir_content(FILES, CONTENT)
+
+    results = search(client, "bob")
+
+    assert results[0]["path"] == "People/Robert Smith.md"
+    assert results[0]["match"] == "Bob"
+
+
+def test_search_typo_and_path(client: TestClient, setup_temp_dir_content):
+    setup_temp_dir_content(FILES, CONTENT)
+
+    assert search(client, "raodmap")[0]["path"] == "Projects/Roadmap.md"
+    assert search(client, "daily/2025")[0]["path"] == "Daily/2025-01-01.md"
+    assert search(client, "ert", limit=1) == [
+        {"path": "People/Robert Smith.md", "score": 0.75, "match": "Robert Smith"}
+    ]
+
+
+def test_search_limit(client: TestClient, setup_temp_dir_content):
+    setup_temp_dir_content(FILES, CONTENT)
+
+    assert len(search(client, "road", limit=1)) == 1
+
+
+def test_search_updates_incrementally(
+    client: TestClient, setup_temp_dir_content, temp_dir
+):
+    setup_temp_dir_content(FILES, CONTENT)
+    assert search(client, "roadmap")[0]["path"] == "Projects/Roadmap.md"
+
+    client.post(
+        "/v1/files/write",
+        params={"path": "Projects/Quarterly plan.md"},
+        json={"frontmatter": None, "content": ["Plan"]},
+    )
+    assert search(client, "quarterly")[0]["path"] == "Projects/Quarterly plan.md"
+
+    os.rename(
+        os.path.join(temp_dir, "Projects/Roadmap.md"),
+        os.path.join(temp_dir, "Projects/Vision.md"),
+    )
+    get_vault_index(temp_dir).refresh()
+
+    assert search(client, "vision")[0]["path"] == "Projects/Vision.md"
+    assert "Projects/Roadmap.md" not in [r["path"] for r in search(client, "roadmap")]
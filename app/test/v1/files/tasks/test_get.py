@@ -0,0 +1,130 @@
+import os
+
+from fastapi.testclient import TestClient
+
+from app.vault_index import get_vault_index
+
+""" Test cases for /v1/files/tasks GET endpoint:
+    - list tasks with status, dates and tags
+    - filter by status, tag, path and due date (invalid dates are rejected)
+    - pagination
+    - line numbers match `read` for CRLF and form feed notes
+    - index updates after writes and external edits
+"""
+
+NOTE = """---
+title: Tasks
+---
+- [ ] Write report 📅 2025-01-10 #work
+- [x] Buy milk #home
+Some text
+```
+- [ ] not a task
+```
+* [ ] Call Bob [due:: 2025-02-01]"""
+
+
+def test_list_tasks(client: TestClient, setup_temp_dir_content):
+    setup_temp_dir_content(["note.md"], {"note.md": NOTE})
+
+    response = client.get("/v1/files/tasks")
+
+    assert response.status_code == 200
+    resp = response.json()
+    assert resp["total"] == 3
+    assert resp["tasks"][0] == {
+        "path": "note.md",
+        "line": 3,
+        "status": " ",
+        "text": "Write report 📅 2025-01-10 #work",
+        "dates": {"due": "2025-01-10"},
+        "tags": ["work"],
+    }
+    assert [t["line"] for t in resp["tasks"]] == [3, 4, 9]
+
+
+def test_task_lines_match_read(client: TestClient, temp_dir):
+    with open(os.path.join(temp_dir, "note.md"), "wb") as f:
+        f.write(b"one\r\ntwo\x0cthree\r\n- [ ] Task\r\n")
+
+    tasks = client.get("/v1/files/tasks").json()["tasks"]
+    lines = client.get("/v1/files/read", params={"path": "note.md"}).json()["content"]
+
+    assert [t["line"] for t in tasks] == [2]
+    assert lines[2] == "- [ ] Task"
+
+
+def test_list_tasks_filters(client: TestClient, setup_temp_dir_content):
+    files = ["note.md", "dir1/other.md", ".hidden/secret.md"]
+    content = {
+        "note.md": NOTE,
+        "dir1/other.md": "- [ ] Other #work",
+        ".hidden/secret.md": "- [ ] Hidden",
+    }
+    setup_temp_dir_content(files, content)
+
+    response = client.get("/v1/files/tasks", params={"status": "open", "tag": "work"})
+    assert [t["text"] for t in response.json()["tasks"]] == [
+        "Other #work",
+        "Write report 📅 2025-01-10 #work",
+    ]
+
+    response = client.get("/v1/files/tasks", params={"status": "done"})
+    assert [t["text"] for t in response.json()["tasks"]] == ["Buy milk #home"]
+
+    response = client.get("/v1/files/tasks", params={"path": "dir1"})
+    assert [t["path"] for t in response.json()["tasks"]] == ["dir1/other.md"]
+
+    response = client.get("/v1/files/tasks", params={"due_before": "2025-01-31"})
+    assert [t["line"] for t in response.json()["tasks"]] == [3]
+
+    for due_before in ("2025-1-5", "tomorrow"):
+        response = client.get("/v1/files/tasks", params={"due_before": due_before})
+        assert response.status_code == 422
+
+
+def test_list_tasks_pagination(client: TestClient, setup_temp_dir_content):
+    setup_temp_dir_content(["note.md"], {"note.md": NOTE})
+
+    response = client.get("/v1/files/tasks", params={"offset": 1, "limit": 1})
+
+    resp = response.json()
+    assert resp["total"] == 3
+    assert [t["line"] for t in resp["tasks"]] == [4]
+
+
+def test_list_tasks_updates_after_write(client: TestClient, setup_temp_dir_content):
+    setup_temp_dir_content(["note.md"], {"note.md": NOTE})
+    assert client.get("/v1/files/tasks").json()["total"] == 3
+
+    client.patch(
+        "/v1/files/write/",
+        params={"path": "note.md", "type": "content"},
+        json={"frontmatter": {}, "content": ["- [ ] New task"]},
+    )
+    client.post(
+        "/v1/files/write/",
+        params={"path": "new.md"},
+        json={"frontmatter": None, "content": ["- [ ] Another task"]},
+    )
+
+    response = client.get("/v1/files/tasks", params={"status": "open"})
+    assert [t["text"] for t in response.json()["tasks"]] == [
+        "Another task",
+        "Write report 📅 2025-01-10 #work",
+        "Call Bob [due:: 2025-02-01]",
+        "New task",
+    ]
+
+
+def test_list_tasks_external_edit(client: TestClient, setup_temp_dir_content, temp_dir):
+    setup_temp_dir_content(["note.md"], {"note.md": NOTE})
+    assert client.get("/v1/files/tasks").json()["total"] == 3
+
+    os.remove(os.path.join(temp_dir, "note.md"))
+    setup_temp_dir_content(["moved.md"], {"moved.md": "- [x] Only task"})
+
+    get_vault_index(temp_dir).refresh()
+
+    response = client.get("/v1/files/tasks")
+    assert [t["path"] for t in response.json()["tasks"]] == ["moved.md"]
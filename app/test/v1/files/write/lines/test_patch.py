@@ -0,0 +1,214 @@
+import os
+
+from fastapi.testclient import TestClient
+
+from app.vault_index import VaultIndex
+
+""" Test cases for /v1/files/write/lines PATCH endpoint:
+    - insert, delete and replace lines
+    - append after the last line
+    - line numbers match `read` and line endings are kept (CRLF, form feed)
+    - error handling:
+        stale base version, also when the note changes right after it was read
+        overlapping operations
+        line out of range
+        path outside the base folder, non-markdown and hidden files
+"""
+
+
+def get_version(client: TestClient, path: str) -> str:
+    response = client.get("/v1/files/read/", params={"path": path})
+    return response.json()["version"]
+
+
+def test_patch_lines_success(client: TestClient, setup_temp_dir_content, temp_dir):
+    files = ["file1.md"]
+    content = {"file1.md": "---\ntitle: Test\n---\nline 1\nline 2\nline 3\nline 4"}
+
+    setup_temp_dir_content(files, content)
+    payload = {
+        "base_version": get_version(client, "file1.md"),
+        "operations": [
+            {"op": "replace", "line": 4, "content": ["line 2 (edited)"]},
+            {"op": "insert", "line": 3, "content": ["line 0.5"]},
+            {"op": "delete", "line": 5, "count": 2},
+        ],
+    }
+
+    response = client.patch(
+        "/v1/files/write/lines", params={"path": "file1.md"}, json=payload
+    )
+
+    assert response.status_code == 200
+    assert response.json().get("version") == get_version(client, "file1.md")
+
+    with open(os.path.join(temp_dir, "file1.md"), "r") as f:
+        assert "---\ntitle: Test\n---\nline 0.5\nline 1\nline 2 (edited)" == f.read()
+
+
+def test_patch_lines_append(client: TestClient, setup_temp_dir_content, temp_dir):
+    files = ["file1.md"]
+    content = {"file1.md": "line 1\nline 2\n"}
+
+    setup_temp_dir_content(files, content)
+    payload = {
+        "base_version": get_version(client, "file1.md"),
+        "operations": [{"op": "insert", "line": 2, "content": ["line 3"]}],
+    }
+
+    response = client.patch(
+        "/v1/files/write/lines", params={"path": "file1.md"}, json=payload
+    )
+
+    assert response.status_code == 200
+
+    with open(os.path.join(temp_dir, "file1.md"), "r") as f:
+        assert "line 1\nline 2\nline 3\n" == f.read()
+
+
+def test_patch_lines_stale_version(
+    client: TestClient, setup_temp_dir_content, temp_dir
+):
+    files = ["file1.md"]
+    content = {"file1.md": "line 1"}
+
+    setup_temp_dir_content(files, content)
+    payload = {
+        "base_version": "stale",
+        "operations": [{"op": "delete", "line": 0}],
+    }
+
+    response = client.patch(
+        "/v1/files/write/lines", params={"path": "file1.md"}, json=payload
+    )
+
+    assert response.status_code == 409
+    assert (
+        response.json().get("message")
+        == "The file 'file1.md' has changed since version 'stale'."
+    )
+
+    with open(os.path.join(temp_dir, "file1.md"), "r") as f:
+        assert "line 1" == f.read()
+
+
+def test_patch_lines_edit_after_read(
+    client: TestClient, setup_temp_dir_content, temp_dir, monkeypatch
+):
+    setup_temp_dir_content(["file1.md"], {"file1.md": "line 1\nline 2"})
+    observe = VaultIndex.observe
+
+    def edit_after_read(index, file_path, *args):
+        observe(index, file_path, *args)
+        with open(os.path.join(temp_dir, file_path), "w") as f:
+            f.write("line 0\nline 1\nline 2")
+
+    monkeypatch.setattr(VaultIndex, "observe", edit_after_read)
+    read = client.get("/v1/files/read", params={"path": "file1.md"}).json()
+    monkeypatch.undo()
+
+    assert read["content"] == ["line 1", "line 2"]
+    response = client.patch(
+        "/v1/files/write/lines",
+        params={"path": "file1.md"},
+        json={
+            "base_version": read["version"],
+            "operations": [{"op": "delete", "line": 0}],
+        },
+    )
+
+    assert response.status_code == 409
+    with open(os.path.join(temp_dir, "file1.md"), "r") as f:
+        assert f.read() == "line 0\nline 1\nline 2"
+
+
+def test_patch_lines_overlapping(client: TestClient, setup_temp_dir_content):
+    files = ["file1.md"]
+    content = {"file1.md": "line 1\nline 2\nline 3"}
+
+    setup_temp_dir_content(files, content)
+    payload = {
+        "base_version": get_version(client, "file1.md"),
+        "operations": [
+            {"op": "delete", "line": 0, "count": 2},
+            {"op": "replace", "line": 1, "content": ["line 2 (edited)"]},
+        ],
+    }
+
+    response = client.patch(
+        "/v1/files/write/lines", params={"path": "file1.md"}, json=payload
+    )
+
+    assert response.status_code == 400
+    assert (
+        response.json().get("message")
+        == "The operation at line 1 overlaps a previous operation."
+    )
+
+
+def test_patch_lines_out_of_range(client: TestClient, setup_temp_dir_content, temp_dir):
+    files = ["file1.md"]
+    content = {"file1.md": "line 1\nline 2"}
+
+    setup_temp_dir_content(files, content)
+    payload = {
+        "base_version": get_version(client, "file1.md"),
+        "operations": [{"op": "delete", "line": 1, "count": 5}],
+    }
+
+    response = client.patch(
+        "/v1/files/write/lines", params={"path": "file1.md"}, json=payload
+    )
+
+    assert response.status_code == 400
+    assert (
+        response.json().get("message")
+        == "The operations exceed the 2 lines of 'file1.md'."
+    )
+    assert os.listdir(temp_dir) == ["file1.md"]
+
+
+def test_patch_lines_keeps_line_endings(client: TestClient, temp_dir):
+    with open(os.path.join(temp_dir, "file1.md"), "wb") as f:
+        f.write(b"one\r\ntwo\x0cthree\r\nfour\r\n")
+
+    read = client.get("/v1/files/read", params={"path": "file1.md"}).json()
+    assert read["content"] == ["one", "two\x0cthree", "four"]
+
+    payload = {
+        "base_version": read["version"],
+        "operations": [
+            {"op": "replace", "line": 1, "content": ["TWO"]},
+            {"op": "insert", "line": 3, "content": ["five"]},
+        ],
+    }
+    response = client.patch(
+        "/v1/files/write/lines", params={"path": "file1.md"}, json=payload
+    )
+
+    assert response.status_code == 200
+    with open(os.path.join(temp_dir, "file1.md"), "rb") as f:
+        assert f.read() == b"one\r\nTWO\r\nfour\r\nfive\r\n"
+
+
+def test_patch_lines_invalid_paths(
+    client: TestClient, setup_temp_dir_content, temp_dir
+):
+    setup_temp_dir_content(["file1.txt", ".obsidian/file1.md"])
+    payload = {"base_version": "0-0-0", "operations": []}
+    cases = {
+        "../outside/secret.md": (400, "The path must stay within the base folder."),
+        "file1.txt": (400, "Only markdown (.md) files can be patched."),
+        ".obsidian/file1.md": (
+            404,
+            "The provided file_path '.obsidian/file1.md' is not a valid file within the base folder.",
+        ),
+    }
+
+    for path, (status_code, message) in cases.items():
+        response = client.patch(
+            "/v1/files/write/lines", params={"path": path}, json=payload
+        )
+
+        assert response.status_code == status_code
+        assert response.json().get("message") == message
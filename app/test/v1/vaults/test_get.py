@@ -0,0 +1,165 @@
+import os
+from tempfile import TemporaryDirectory
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app import file_handler, main
+from app import vault_index as vault_index_module
+from app.env import parse_vaults
+from app.file_handler import VaultRegistry
+from app.main import app
+
+""" Test cases for /v1/vaults endpoints:
+    - each vault is served from its own folder
+    - vault listing with load state
+    - idle vaults are unloaded lazily
+    - per-vault index budget
+    - VAULTS parsing
+    - error handling:
+        unknown vault
+        missing vault folder
+        malformed VAULTS entry
+"""
+
+
+@pytest.fixture
+def vault_dirs():
+    with TemporaryDirectory() as work, TemporaryDirectory() as home:
+        for base, name in ((work, "work.md"), (home, "home.md")):
+            with open(os.path.join(base, name), "w") as f:
+                f.write("- [ ] Task")
+        yield {"work": work, "home": home, "gone": os.path.join(home, "missing")}
+
+
+@pytest.fixture
+def registry(vault_dirs, monkeypatch):
+    def install(idle_timeout: float = 900, **limits: int) -> VaultRegistry:
+        vaults = VaultRegistry(
+            {name: (path, limits.get(name, 0)) for name, path in vault_dirs.items()},
+            idle_timeout,
+        )
+        monkeypatch.setattr(file_handler, "vaults", vaults)
+        monkeypatch.setattr(main, "vaults", vaults)
+        return vaults
+
+    yield install
+
+
+@pytest.fixture
+def vault_client():
+    with TestClient(app) as c:
+        yield c
+
+
+def test_vaults_are_isolated(vault_client: TestClient, registry):
+    registry()
+
+    work = vault_client.get("/v1/vaults/work/files/")
+    home = vault_client.get("/v1/vaults/home/files/")
+
+    assert work.json() == ["work.md"]
+    assert home.json() == ["home.md"]
+    tasks = vault_client.get("/v1/vaults/home/files/tasks").json()
+    assert [t["path"] for t in tasks["tasks"]] == ["home.md"]
+
+
+def test_list_vaults(vault_client: TestClient, registry):
+    registry()
+    vault_client.get("/v1/vaults/work/files/tasks")
+
+    stats = {v["name"]: v for v in vault_client.get("/v1/vaults").json()}
+
+    assert set(stats) == {"work", "home", "gone"}
+    assert stats["work"]["loaded"] is True
+    assert stats["work"]["notes_indexed"] == 1
+    assert stats["work"]["active_requests"] == 0
+    assert stats["home"]["loaded"] is False
+
+
+def test_idle_vaults_are_evicted(vault_client: TestClient, registry, vault_dirs):
+    vaults = registry(idle_timeout=0)
+    vault_client.get("/v1/vaults/work/files/tasks")
+    assert vault_dirs["work"] in vault_index_module._indexes
+
+    vault_client.get("/v1/vaults/home/files/")
+
+    assert vaults.vaults["work"].handler is None
+    assert vault_dirs["work"] not in vault_index_module._indexes
+    assert vault_client.get("/v1/vaults/work/files/").json() == ["work.md"]
+
+
+def test_vault_index_budget(
+    vault_client: TestClient, registry, vault_dirs, monkeypatch
+):
+    registry(work=1)
+    with open(os.path.join(vault_dirs["work"], "second.md"), "w") as f:
+        f.write("- [ ] Task")
+
+    response = vault_client.get("/v1/vaults/work/files/search", params={"q": "work"})
+
+    assert response.status_code == 507
+    assert (
+        response.json().get("message")
+        == "The vault index exceeds its budget of 1 notes."
+    )
+    assert (
+        vault_client.get("/v1/vaults/home/files/search", params={"q": "home"}).json()[
+            "results"
+        ][0]["path"]
+        == "home.md"
+    )
+
+
+def test_over_budget_vault_is_not_rewalked(
+    vault_client: TestClient, registry, vault_dirs, monkeypatch
+):
+    registry(work=1)
+    with open(os.path.join(vault_dirs["work"], "second.md"), "w") as f:
+        f.write("- [ ] Task")
+    assert vault_client.get("/v1/vaults/work/files/tasks").status_code == 507
+
+    walks = []
+    walk_notes = vault_index_module.walk_notes
+    monkeypatch.setattr(
+        vault_index_module,
+        "walk_notes",
+        lambda base_folder: walks.append(base_folder) or walk_notes(base_folder),
+    )
+    assert vault_client.get("/v1/vaults/work/files/tasks").status_code == 507
+    assert walks == []
+
+    os.remove(os.path.join(vault_dirs["work"], "second.md"))
+    vault_index_module._indexes[vault_dirs["work"]].refresh()
+
+    assert vault_client.get("/v1/vaults/work/files/tasks").json()["total"] == 1
+    assert walks == [vault_dirs["work"]]
+
+
+def test_parse_vaults():
+    assert parse_vaults(" work = /vaults/work , home=/vaults/home:500,") == {
+        "work": ("/vaults/work", 0),
+        "home": ("/vaults/home", 500),
+    }
+    assert parse_vaults("") == {}
+    for spec in ("/vaults/work", "=/vaults/work", "work=", "a/b=/vaults/work"):
+        with pytest.raises(ValueError):
+            parse_vaults(spec)
+
+
+def test_unknown_vault(vault_client: TestClient, registry):
+    registry()
+
+    response = vault_client.get("/v1/vaults/unknown/files/")
+
+    assert response.status_code == 404
+    assert response.json().get("message") == "The vault 'unknown' does not exist."
+
+
+def test_missing_vault_folder(vault_client: TestClient, registry):
+    registry()
+
+    response = vault_client.get("/v1/vaults/gone/files/")
+
+    assert response.status_code == 503
+    assert response.json().get("message") == "The vault 'gone' is not available."
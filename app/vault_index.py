@@ -0,0 +1,600 @@
+import asyncio
+import hashlib
+import os
+import re
+import stat as stat_module
+import threading
+from collections.abc import Callable
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import TYPE_CHECKING, Protocol
+
+import yaml
+from loguru import logger
+from starlette.concurrency import run_in_threadpool
+
+from .env import SHARED_INDEX_DIR, VAULT_MAX_NOTES
+from .exception import CustomError
+from .search import TrigramIndex
+
+if TYPE_CHECKING:
+    from .shared_index import SharedVaultIndex
+
+TASK_PATTERN = re.compile(r"^\s*[-*+]\s\[(?P<status>.)\]\s+(?P<text>.*)$")
+DATE_PATTERN = re.compile(
+    r"(?:(?P<emoji>📅|⏳|🛫|✅|➕)|\[?(?P<key>due|scheduled|start|done|created)::)"
+    r"\s*(?P<date>\d{4}-\d{2}-\d{2})"
+)
+TAG_PATTERN = re.compile(r"(?<![\w/&])#([\w/-]+)")
+
+DATE_EMOJIS = {
+    "📅": "due",
+    "⏳": "scheduled",
+    "🛫": "start",
+    "✅": "done",
+    "➕": "created",
+}
+
+
+@dataclass
+class Task:
+    path: str
+    line: int
+    status: str
+    text: str
+    dates: dict[str, str] = field(default_factory=dict)
+    tags: list[str] = field(default_factory=list)
+
+    @property
+    def done(self) -> bool:
+        return self.status in ("x", "X")
+
+
+@dataclass
+class NoteEntry:
+    stat_key: tuple[int, int, int]
+    hash: str
+    tasks: list[Task]
+    aliases: list[str]
+
+
+def split_lines(text: str) -> list[str]:
+    """
+    Splits note text into lines on "\n" only, dropping a trailing "\r" from each line.
+    Unlike `str.splitlines`, characters such as form feeds stay inside their line, so
+    line numbers match the lines `FileHandler.patch_lines` operates on.
+    """
+    lines = text.split("\n")
+    if lines[-1] == "":
+        lines.pop()
+    return [line.removesuffix("\r") for line in lines]
+
+
+def stat_key(stat: os.stat_result) -> tuple[int, int, int]:
+    return (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+
+def extract_aliases(lines: list[str]) -> list[str]:
+    """
+    Returns the `aliases` (or `alias`) of a note's frontmatter. The YAML is only
+    parsed when the frontmatter mentions an alias key.
+    """
+    if not lines or lines[0].strip() != "---":
+        return []
+
+    frontmatter: list[str] = []
+    for line in lines[1:]:
+        if line.strip() == "---":
+            break
+        frontmatter.append(line)
+
+    if not any(line.startswith(("aliases:", "alias:")) for line in frontmatter):
+        return []
+
+    try:
+        data = yaml.safe_load("\n".join(frontmatter))
+    except yaml.YAMLError:
+        return []
+    if not isinstance(data, dict):
+        return []
+
+    aliases = data.get("aliases", data.get("alias"))
+    if isinstance(aliases, str):
+        aliases = [aliases]
+    if not isinstance(aliases, list):
+        return []
+    return [str(alias) for alias in aliases if alias]
+
+
+def extract_tasks(path: str, lines: list[str]) -> list[Task]:
+    """
+    Extracts checkbox items from the lines of a note, skipping the frontmatter
+    and fenced code blocks. Line numbers are 0-based indices into `lines`.
+    """
+    tasks: list[Task] = []
+    start = 0
+    in_code_block = False
+
+    if lines and lines[0].strip() == "---":
+        for index, line in enumerate(lines[1:], start=1):
+            if line.strip() == "---":
+                start = index + 1
+                break
+
+    for index in range(start, len(lines)):
+        line = lines[index]
+        if line.lstrip().startswith("```"):
+            in_code_block = not in_code_block
+            continue
+        if in_code_block:
+            continue
+
+        match = TASK_PATTERN.match(line)
+        if not match:
+            continue
+
+        text = match.group("text").strip()
+        dates = {
+            DATE_EMOJIS[m.group("emoji")] if m.group("emoji") else m.group("key"): (
+                m.group("date")
+            )
+            for m in DATE_PATTERN.finditer(text)
+        }
+        tags = TAG_PATTERN.findall(text)
+
+        tasks.append(
+            Task(
+                path=path,
+                line=index,
+                status=match.group("status"),
+                text=text,
+                dates=dates,
+                tags=tags,
+            )
+        )
+
+    return tasks
+
+
+def index_note(file_path: str, data: bytes, lines: list[str], key: tuple) -> NoteEntry:
+    return NoteEntry(
+        stat_key=key,
+        hash=hashlib.sha256(data).hexdigest(),
+        tasks=extract_tasks(file_path, lines),
+        aliases=extract_aliases(lines),
+    )
+
+
+def budget_error(max_notes: int) -> CustomError:
+    return CustomError(
+        status_code=507,
+        message=f"The vault index exceeds its budget of {max_notes} notes.",
+    )
+
+
+def walk_notes(base_folder: str) -> dict[str, tuple[int, int, int]]:
+    """
+    Returns the stat key of every indexable note in the vault, without reading any.
+    """
+    base = Path(base_folder)
+    found = {}
+    for full_path in base.rglob("*.md"):
+        file_path = full_path.relative_to(base).as_posix()
+        if not is_indexable(file_path):
+            continue
+        try:
+            stat = full_path.stat()
+        except FileNotFoundError:
+            continue
+        if stat_module.S_ISREG(stat.st_mode):
+            found[file_path] = stat_key(stat)
+    return found
+
+
+def is_indexable(file_path: str) -> bool:
+    path = Path(file_path)
+    return path.suffix == ".md" and not any(part.startswith(".") for part in path.parts)
+
+
+def in_dir(file_path: str, prefix: str) -> bool:
+    return not prefix or file_path == prefix or file_path.startswith(prefix + "/")
+
+
+def task_matches(
+    task: Task, status: str, tag: str | None, due_before: str | None
+) -> bool:
+    return (
+        (
+            status == "all"
+            or (status == "done" and task.done)
+            or (status == "open" and task.status == " ")
+        )
+        and (tag is None or tag.lstrip("#") in task.tags)
+        and (
+            due_before is None
+            or ("due" in task.dates and task.dates["due"] <= due_before)
+        )
+    )
+
+
+def merkle_hash(children: list[tuple[str, str, str]]) -> str:
+    """
+    Hashes a directory from its sorted (kind, name, hash) children, where kind is "f"
+    for a note and "d" for a subdirectory.
+    """
+    digest = hashlib.sha256()
+    for kind, name, child_hash in children:
+        digest.update(f"{kind} {name} {child_hash}\n".encode())
+    return digest.hexdigest()
+
+
+class NoteIndex(Protocol):
+    """
+    The index of one vault, as used by the file handler, the warmup and the refresher.
+    `VaultIndex` keeps it in memory, `SharedVaultIndex` in a file shared by all workers.
+    """
+
+    base_folder: str
+    max_notes: int
+    built: bool
+    over_budget: bool
+
+    def __len__(self) -> int: ...
+
+    def refresh(self) -> None:
+        """
+        Walks the vault, re-reading new or changed notes and dropping deleted ones.
+        Unchanged notes only cost a stat call, and a vault over its budget is
+        rejected before any note is read.
+        """
+        ...
+
+    def ensure_built(self) -> None:
+        """
+        Builds the index on first use. Raises a 507 while the vault is over budget.
+        """
+        ...
+
+    def update(self, file_path: str) -> None:
+        """
+        Re-indexes a single note after it was written, or drops it if it is gone.
+        Does nothing until the index has been built.
+        """
+        ...
+
+    def observe(
+        self, file_path: str, data: bytes, lines: list[str], stat: os.stat_result
+    ) -> None:
+        """
+        Feeds a note that was read for another purpose into the index, so a changed
+        note is re-indexed without reading it again.
+        """
+        ...
+
+    def manifest(self, dir_path: str = "") -> dict:
+        """
+        Returns the Merkle hash of a directory together with the hashes of its direct
+        subdirectories and notes. Clients compare these with their own copy and only
+        descend into subdirectories whose hash differs.
+        """
+        ...
+
+    def search(self, query: str, limit: int = 10) -> list[dict]:
+        """
+        Fuzzy-matches the query against note paths, basenames and aliases.
+        """
+        ...
+
+    def query_tasks(
+        self,
+        status: str = "all",
+        path: str = "",
+        tag: str | None = None,
+        due_before: str | None = None,
+        offset: int = 0,
+        limit: int = 100,
+    ) -> tuple[int, list[dict]]:
+        """
+        Returns the total number of matching tasks and one page of them, ordered by
+        note path and line. `status` is "open", "done" or "all".
+        """
+        ...
+
+
+class VaultIndex(NoteIndex):
+    """
+    In-memory index of the markdown notes of a vault.
+    - Entries are keyed by the relative note path and remember the (inode, mtime, size)
+      they were built from, so a refresh only re-reads and re-hashes notes that changed.
+    - The index is built lazily on first use and kept current by `update` (after writes
+      through the API), `observe` (when a note is read anyway) and periodic `refresh`
+      calls that pick up external edits.
+    - Directory hashes form a Merkle tree over the note hashes. A change only invalidates
+      the hashes of the note's ancestors, which are recomputed on the next lookup.
+    - Paths, basenames and frontmatter aliases feed a trigram index for fuzzy search.
+    - `max_notes` caps the memory a vault may use for its index. A vault that outgrows
+      it has its index dropped and is marked over budget: index-backed lookups fail
+      with a 507 without touching the disk, until a periodic refresh finds the vault
+      back under the cap.
+    """
+
+    def __init__(self, base_folder: str, max_notes: int = 0):
+        self.base_folder = base_folder
+        self.max_notes = max_notes
+        self.over_budget = False
+        self._lock = threading.RLock()
+        self.__clear()
+
+    def __clear(self) -> None:
+        self.built = False
+        self.notes: dict[str, NoteEntry] = {}
+        self.dirs: dict[str, set[str]] = {"": set()}
+        self.dir_hashes: dict[str, str] = {}
+        self.paths = TrigramIndex()
+
+    def __check_budget(self, file_path: str) -> None:
+        if (
+            self.max_notes
+            and file_path not in self.notes
+            and len(self.notes) >= self.max_notes
+        ):
+            self.__clear()
+            self.over_budget = True
+            raise budget_error(self.max_notes)
+
+    def __len__(self) -> int:
+        return len(self.notes)
+
+    def __parent(self, path: str) -> str:
+        parent = Path(path).parent.as_posix()
+        return "" if parent == "." else parent
+
+    def __invalidate(self, path: str) -> None:
+        while path:
+            path = self.__parent(path)
+            self.dir_hashes.pop(path, None)
+
+    def __set(self, file_path: str, data: bytes, lines: list[str], key: tuple) -> None:
+        self.__check_budget(file_path)
+        if file_path not in self.notes:
+            child = file_path
+            while child:
+                parent = self.__parent(child)
+                siblings = self.dirs.setdefault(parent, set())
+                if child in siblings:
+                    break
+                siblings.add(child)
+                child = parent
+
+        self.notes[file_path] = index_note(file_path, data, lines, key)
+        self.paths.add(file_path, self.notes[file_path].aliases)
+        self.__invalidate(file_path)
+
+    def __remove(self, file_path: str) -> None:
+        if self.notes.pop(file_path, None) is None:
+            return
+
+        self.paths.remove(file_path)
+        self.__invalidate(file_path)
+        child = file_path
+        while child:
+            parent = self.__parent(child)
+            siblings = self.dirs[parent]
+            siblings.discard(child)
+            if siblings or not parent:
+                break
+            del self.dirs[parent]
+            child = parent
+
+    def __load(self, file_path: str, key: tuple) -> None:
+        full_path = Path(self.base_folder) / file_path
+        with open(full_path, "rb") as f:
+            data = f.read()
+        self.__set(file_path, data, split_lines(data.decode("utf-8")), key)
+
+    def refresh(self) -> None:
+        found = walk_notes(self.base_folder)
+        with self._lock:
+            if self.max_notes and len(found) > self.max_notes:
+                self.__clear()
+                self.over_budget = True
+                raise budget_error(self.max_notes)
+            self.over_budget = False
+
+        for file_path, key in found.items():
+            with self._lock:
+                entry = self.notes.get(file_path)
+                if entry is not None and entry.stat_key == key:
+                    continue
+                try:
+                    self.__load(file_path, key)
+                except (FileNotFoundError, UnicodeDecodeError) as e:
+                    logger.warning("Could not index '{}': {}", file_path, e)
+
+        with self._lock:
+            for file_path in self.notes.keys() - found.keys():
+                self.__remove(file_path)
+            self.built = True
+
+    def ensure_built(self) -> None:
+        if self.over_budget:
+            raise budget_error(self.max_notes)
+        if not self.built:
+            self.refresh()
+
+    def update(self, file_path: str) -> None:
+        file_path = Path(file_path).as_posix()
+        if not self.built or not is_indexable(file_path):
+            return
+
+        full_path = Path(self.base_folder) / file_path
+        with self._lock:
+            if not full_path.is_file():
+                self.__remove(file_path)
+                return
+            try:
+                self.__load(file_path, stat_key(full_path.stat()))
+            except CustomError as ce:
+                logger.warning(
+                    "Dropped index of '{}': {}", self.base_folder, ce.message
+                )
+
+    def observe(
+        self, file_path: str, data: bytes, lines: list[str], stat: os.stat_result
+    ) -> None:
+        file_path = Path(file_path).as_posix()
+        if not self.built or not is_indexable(file_path):
+            return
+
+        key = stat_key(stat)
+        with self._lock:
+            entry = self.notes.get(file_path)
+            if entry is None or entry.stat_key != key:
+                try:
+                    self.__set(file_path, data, lines, key)
+                except CustomError as ce:
+                    logger.warning(
+                        "Dropped index of '{}': {}", self.base_folder, ce.message
+                    )
+
+    def __dir_hash(self, dir_path: str) -> str:
+        cached = self.dir_hashes.get(dir_path)
+        if cached is not None:
+            return cached
+
+        self.dir_hashes[dir_path] = merkle_hash(
+            [
+                (
+                    ("f", Path(child).name, self.notes[child].hash)
+                    if child in self.notes
+                    else ("d", Path(child).name, self.__dir_hash(child))
+                )
+                for child in sorted(self.dirs.get(dir_path, ()))
+            ]
+        )
+        return self.dir_hashes[dir_path]
+
+    def manifest(self, dir_path: str = "") -> dict:
+        self.ensure_built()
+
+        dir_path = Path(dir_path).as_posix().strip("/")
+        dir_path = "" if dir_path == "." else dir_path
+        with self._lock:
+            children = sorted(self.dirs.get(dir_path, ()))
+            return {
+                "path": dir_path,
+                "hash": self.__dir_hash(dir_path),
+                "dirs": {
+                    child: self.__dir_hash(child)
+                    for child in children
+                    if child not in self.notes
+                },
+                "files": {
+                    child: self.notes[child].hash
+                    for child in children
+                    if child in self.notes
+                },
+            }
+
+    def search(self, query: str, limit: int = 10) -> list[dict]:
+        self.ensure_built()
+
+        with self._lock:
+            return self.paths.search(query, limit)
+
+    def query_tasks(
+        self,
+        status: str = "all",
+        path: str = "",
+        tag: str | None = None,
+        due_before: str | None = None,
+        offset: int = 0,
+        limit: int = 100,
+    ) -> tuple[int, list[dict]]:
+        self.ensure_built()
+
+        prefix = path.strip("/")
+        with self._lock:
+            file_paths = sorted(p for p in self.notes if in_dir(p, prefix))
+            matches = [
+                task
+                for p in file_paths
+                for task in self.notes[p].tasks
+                if task_matches(task, status, tag, due_before)
+            ]
+
+        return len(matches), [asdict(t) for t in matches[offset : offset + limit]]
+
+
+_indexes: dict[str, NoteIndex] = {}
+_indexes_lock = threading.Lock()
+
+
+def get_vault_index(base_folder: str, max_notes: int = VAULT_MAX_NOTES) -> NoteIndex:
+    with _indexes_lock:
+        index = _indexes.get(base_folder)
+        if index is None:
+            if SHARED_INDEX_DIR:
+                from .shared_index import SharedVaultIndex
+
+                index = SharedVaultIndex(
+                    base_folder, SHARED_INDEX_DIR, max_notes=max_notes
+                )
+            else:
+                index = VaultIndex(base_folder, max_notes=max_notes)
+            _indexes[base_folder] = index
+        return index
+
+
+def drop_vault_index(base_folder: str) -> None:
+    with _indexes_lock:
+        _indexes.pop(base_folder, None)
+
+
+def _indexes_to_refresh(
+    vaults: dict[str, int], shared: dict[str, "SharedVaultIndex"]
+) -> list[NoteIndex]:
+    """
+    The indexes this process opened, plus, with a shared index directory, the shared
+    index of every configured vault. Those live in files all workers read, so they are
+    kept current whether or not the owner has opened (or already evicted) the vault.
+    """
+    with _indexes_lock:
+        indexes = {index.base_folder: index for index in _indexes.values()}
+    if SHARED_INDEX_DIR:
+        from .shared_index import SharedVaultIndex
+
+        for base_folder, max_notes in vaults.items():
+            if base_folder not in shared:
+                shared[base_folder] = SharedVaultIndex(
+                    base_folder, SHARED_INDEX_DIR, max_notes=max_notes
+                )
+            indexes.setdefault(base_folder, shared[base_folder])
+    return list(indexes.values())
+
+
+async def refresh_indexes_periodically(
+    interval: float,
+    owns_indexes: Callable[[], bool] = lambda: True,
+    vaults: dict[str, int] | None = None,
+) -> None:
+    """
+    Keeps built indexes current with external edits by re-walking them every `interval` seconds.
+    With several workers sharing the indexes, only the process `owns_indexes` elects walks them,
+    covering every vault in `vaults` (base folder to note budget).
+    """
+    shared: dict[str, SharedVaultIndex] = {}
+    while True:
+        await asyncio.sleep(interval)
+        if not owns_indexes():
+            continue
+        for index in await run_in_threadpool(_indexes_to_refresh, vaults or {}, shared):
+            # Over-budget vaults are re-checked, so they recover once notes are removed.
+            if not (index.built or index.over_budget):
+                continue
+            try:
+                await run_in_threadpool(index.refresh)
+            except Exception as e:
+                logger.error(
+                    "Failed to refresh index for '{}': {}", index.base_folder, e
+                )
@@ -0,0 +1,149 @@
+import fcntl
+import os
+import time
+from collections import Counter
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Literal
+
+from loguru import logger
+from starlette.concurrency import run_in_threadpool
+
+from .env import VAULT_MAX_NOTES
+from .exception import CustomError
+from .file_handler import FileHandler
+
+# Read counts of the current run, persisted on shutdown so the next start knows
+# which notes are hot.
+note_reads: Counter[str] = Counter()
+_started = time.time()
+
+
+def record_read(file_path: str) -> None:
+    note_reads[file_path] += 1
+
+
+def _read_hot_notes(path: Path) -> Counter[str]:
+    # One note per line, hottest first, as "<reads>\t<path>" or just "<path>".
+    counts: Counter[str] = Counter()
+    lines = [line.strip() for line in path.read_text(encoding="utf-8").splitlines()]
+    for rank, line in enumerate(filter(None, lines)):
+        reads, separator, file_path = line.partition("\t")
+        if separator and reads.isdigit():
+            counts[file_path] += int(reads)
+        else:
+            counts[line] += len(lines) - rank
+    return counts
+
+
+def load_hot_notes(hot_notes_file: str) -> list[str]:
+    path = Path(hot_notes_file)
+    if not path.is_file():
+        return []
+    return [file_path for file_path, _ in _read_hot_notes(path).most_common()]
+
+
+def save_hot_notes(hot_notes_file: str, limit: int) -> None:
+    """
+    Every worker saves its own counts on shutdown. They are added to the counts
+    already saved by the other workers of this run, instead of overwriting them;
+    the file left by a previous run is replaced.
+    """
+    if not note_reads:
+        return
+    path = Path(hot_notes_file)
+    with open(f"{hot_notes_file}.lock", "w") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        counts = Counter(note_reads)
+        if path.is_file() and os.stat(path).st_mtime >= _started:
+            counts += _read_hot_notes(path)
+        hot_notes = [
+            f"{reads}\t{file_path}" for file_path, reads in counts.most_common(limit)
+        ]
+        path.write_text("\n".join(hot_notes), encoding="utf-8")
+
+
+@dataclass
+class WarmupState:
+    phase: Literal[
+        "pending", "indexing", "preloading", "ready", "over_budget", "failed"
+    ] = "pending"
+    notes_indexed: int = 0
+    hot_notes_total: int = 0
+    hot_notes_loaded: int = 0
+    duration_ms: float | None = None
+    error: str | None = None
+
+    @property
+    def ready(self) -> bool:
+        # A vault over its note budget still serves reads and writes, only its
+        # index-backed lookups answer 507.
+        return self.phase in ("ready", "over_budget")
+
+    @property
+    def finished(self) -> bool:
+        return self.phase in ("ready", "over_budget", "failed")
+
+    def to_response(self) -> dict:
+        return {"ready": self.ready, **asdict(self)}
+
+
+class Warmup:
+    """
+    Prepares a vault before it receives traffic:
+    - walks the vault to build the index (tasks, hashes), or with `refresh=False`
+      waits for the worker that owns a shared index to build it,
+    - reads the hot notes so they are in the page cache and parsed once.
+    Hot notes come from the configured list followed by the most read notes of
+    the previous run. A hot note that no longer exists is skipped.
+    """
+
+    def __init__(
+        self, base_folder: str, hot_notes: list[str], max_notes: int = VAULT_MAX_NOTES
+    ):
+        self.base_folder = base_folder
+        self.max_notes = max_notes
+        self.hot_notes = list(dict.fromkeys(hot_notes))
+        self.state = WarmupState()
+
+    def __preload(self, fh: FileHandler, file_path: str) -> None:
+        try:
+            fh.get_frontmatter(file_path)
+        except Exception as e:
+            logger.debug("Skipping hot note '{}': {}", file_path, e)
+
+    async def run(self, refresh: bool = True) -> None:
+        started = time.perf_counter()
+        try:
+            fh = await run_in_threadpool(
+                FileHandler, base_folder=self.base_folder, max_notes=self.max_notes
+            )
+
+            self.state.phase = "indexing"
+            try:
+                await run_in_threadpool(
+                    fh.index.refresh if refresh else fh.index.ensure_built
+                )
+            except CustomError as ce:
+                if ce.status_code != 507:
+                    raise
+                # The periodic refresh rebuilds the index once the vault shrinks.
+                logger.warning("Not indexing '{}': {}", self.base_folder, ce.message)
+                self.state.phase = "over_budget"
+                self.state.error = ce.message
+                return
+            self.state.notes_indexed = len(fh.index)
+
+            self.state.phase = "preloading"
+            self.state.hot_notes_total = len(self.hot_notes)
+            for file_path in self.hot_notes:
+                await run_in_threadpool(self.__preload, fh, file_path)
+                self.state.hot_notes_loaded += 1
+
+            self.state.phase = "ready"
+        except Exception as e:
+            logger.error("Warmup of '{}' failed: {}", self.base_folder, e)
+            self.state.phase = "failed"
+            self.state.error = str(e)
+        finally:
+            self.state.duration_ms = round((time.perf_counter() - started) * 1000, 3)